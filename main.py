@@ -9,181 +9,562 @@ Implementation of Section 4 from cissdcm.md: Probability at Event Zero
 Monte Carlo estimation of collision probability for trajectories through debris cloud.
 """
 
+from multiprocessing import Pool, shared_memory
 from scipy import stats
 from src.gdmpidc import *
 from src.gdmpidc_tools import *
 from src.geometric_analysis import *
+from src.cloud_io import *
+from src import instrumentation
 import numpy as np
+import os
 import time
 
-def calculate_number_density(cloud, Lc, position):
+class NumberDensityField:
+    """
+    Summed number density ρ_N(r) = Σ_bins ρ(r, L_c)/M̄(L_c) · dN/dL_c of every SubCloud (Eq. 4.4).
+
+    The per-bin coefficients (μ, ρ0, σ, R_c, mean mass, dN/dL_c) are tabulated once, at time 𝑡,
+    and positions are evaluated in one broadcasted (positions × bins) operation.
+    """
+
+    def __init__(self, cloud, t=0.0):
+        subclouds = [sc for category in cloud.subclouds for sc in cloud.subclouds[category].values()]
+        if not subclouds:
+            raise ValueError("NumberDensityField needs a binned Cloud (res=None clouds have no SubClouds)")
+        self.t = t
+        self.Lc = np.array([sc.fragSize for sc in subclouds])
+        params = np.array([empirical_parameters(Lc) for Lc in self.Lc]).reshape(-1, 5)
+        self.μ, self.ρ0 = params[:, 0], params[:, 1]
+        self.σ = np.array([sc.spatial_dispersion(t) for sc in subclouds])
+        self.Rc = np.array([sc.updated_radius(t) for sc in subclouds])
+        self.mean_mass = expected_mass(self.Lc)
+        # From Equation (2.8): n(L_c) = -d/dL_c[N(L_c)]
+        self.dN_dLc = differential_size_distribution(self.Lc, cloud.parent_mass, cloud.breakup_type)
+        self.coefficient = self.ρ0 / self.mean_mass * self.dN_dLc
+
+    def __call__(self, positions, per_bin=False, chunk=4096):
+        """
+        Number density at (𝑀,3) positions.
+
+        Returns:
+            np.ndarray: (𝑀,) summed over bins, or (𝑀, n_bins) with per_bin=True
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 3)
+        r = np.linalg.norm(positions, axis=1)
+        width = self.σ * self.Rc
+        out = np.empty((len(r), len(self.Lc)) if per_bin else len(r))
+        for start in range(0, len(r), chunk):
+            rho = self.coefficient * np.exp(-0.5 * ((r[start:start + chunk, None] - self.μ*self.Rc) / width)**2)
+            out[start:start + chunk] = rho if per_bin else rho.sum(axis=1)
+        return out
+
+class ImpactParameterTable:
+    """
+    Column density of every SubCloud tabulated against the impact parameter 𝑏 of a line.
+
+    The density is radially symmetric, so the integrated rate of Equation (4.2) along a line only
+    depends on 𝑏 = its distance from the center:
+        ∫_ℒ ρ_N ds = Σ_bins coefficient · 2∫_0^ℎ exp(-(√(𝑏² + 𝑠²) - μR_c)²/(2(σR_c)²)) ds,  ℎ = √(R² - 𝑏²)
+    over the chord inside the cloud radius R.  Each line integral is split at the radii
+    μR_c + 𝑘σR_c (𝑘 = 0, ±1, ±2, ±4, ±8) and evaluated with Gauss-Legendre panels, which is exact
+    to rounding; the nodes are uniform in θ = arcsin(𝑏/R), where the chord half-length R·cos θ is
+    smooth.  Queries are then a linear interpolation, independent of the hit distance, which
+    only enters as the factor πℓ².
+    """
+
+    offsets = np.array([-8, -4, -2, -1, 0, 1, 2, 4, 8], dtype=float)
+
+    def __init__(self, cloud, t=0.0, n_grid=1025, order=16, field=None):
+        self.field = NumberDensityField(cloud, t) if field is None else field
+        self.radius = cloud.radius
+        self.theta = np.linspace(0, np.pi/2, n_grid)
+        b = self.radius * np.sin(self.theta)
+        half_length = self.radius * np.cos(self.theta)
+        nodes, weights = np.polynomial.legendre.leggauss(order)
+
+        # (n_grid, n_bins) column densities of one unit-coefficient shell per bin
+        self.column = np.empty((n_grid, len(self.field.Lc)))
+        for k, (peak, width) in enumerate(zip(self.field.μ*self.field.Rc, self.field.σ*self.field.Rc)):
+            # Panel edges in 𝑠 at the breakpoint radii that the chord crosses
+            r_break = np.maximum(peak + width*self.offsets, 0)
+            s_break = np.sqrt(np.maximum(r_break[np.newaxis, :]**2 - b[:, np.newaxis]**2, 0))
+            edges = np.sort(np.column_stack((np.zeros(n_grid), np.minimum(s_break, half_length[:, np.newaxis]), half_length)), axis=1)
+            lo, hi = edges[:, :-1, np.newaxis], edges[:, 1:, np.newaxis]
+            s = 0.5*(hi - lo)*nodes + 0.5*(hi + lo)
+            r = np.sqrt(b[:, np.newaxis, np.newaxis]**2 + s**2)
+            integrand = np.exp(-0.5*((r - peak)/width)**2)
+            self.column[:, k] = 2*np.sum(0.5*(hi - lo)[..., 0]*(integrand @ weights), axis=1)
+        self.column *= self.field.coefficient
+        self.total = self.column.sum(axis=1)
+
+    def column_density(self, b, per_bin=False):
+        """
+        ∫_ℒ ρ_N ds of lines with impact parameters 𝑏 (zero outside the cloud radius).
+
+        Returns:
+            np.ndarray: shaped like 𝑏, or (…, n_bins) with per_bin=True
+        """
+        b = np.asarray(b, dtype=float)
+        theta = np.arcsin(np.clip(b / self.radius, 0, 1))
+        position = theta / self.theta[-1] * (len(self.theta) - 1)
+        index = np.minimum(position.astype(np.intp), len(self.theta) - 2)
+        frac = (position - index)[..., np.newaxis] if per_bin else position - index
+        table = self.column if per_bin else self.total
+        value = (1 - frac)*table[index] + frac*table[index + 1]
+        inside = b < self.radius
+        return np.where(inside[..., np.newaxis] if per_bin else inside, value, 0.0)
+
+    def rate(self, b, hit_distance, per_bin=False):
+        """Integrated collision rate Λ(𝑏) = πℓ² ∫_ℒ ρ_N ds (Equations 4.2-4.3)."""
+        return np.pi * hit_distance**2 * self.column_density(b, per_bin)
+
+    def probability(self, b, hit_distance, per_bin=False):
+        """Impact probability 1 - exp(-Λ(𝑏)) (Equation 4.2), summed or per bin."""
+        return -np.expm1(-self.rate(b, hit_distance, per_bin))
+
+    @staticmethod
+    def impact_parameters(p1s, p2s):
+        """Distance from the center to the lines through each (p1, p2) pair."""
+        p1s = np.asarray(p1s, dtype=float).reshape(-1, 3)
+        u = np.asarray(p2s, dtype=float).reshape(-1, 3) - p1s
+        u /= np.linalg.norm(u, axis=1)[:, np.newaxis]
+        closest = p1s - np.einsum("ij,ij->i", p1s, u)[:, np.newaxis]*u
+        return np.linalg.norm(closest, axis=1)
+
+    def chord_probabilities(self, chords, hit_distance, per_bin=False):
+        """probability() of a (𝑛,2,3) array of entry/exit points."""
+        chords = np.asarray(chords, dtype=float).reshape(-1, 2, 3)
+        return self.probability(self.impact_parameters(chords[:, 0], chords[:, 1]), hit_distance, per_bin)
+
+def calculate_number_density(cloud, Lc, position, field=None):
     """
     Calculate number density at a position for fragments of characteristic length Lc.
     Based on Equation (4.4) from cissdcm.md: ρ_N(r, L_c) = ρ(r, L_c)/M * dN/dL_c
+
+    Pass a prebuilt NumberDensityField to reuse it across calls.
     """
 
-    # Get mass density at position
-    # r = np.sqrt(position[0]**2 + position[1]**2 + position[2]**2)
-    
-    # Find the appropriate subcloud for this Lc
-    subcloud = None
-    for category in cloud.subclouds:
-        for size, sc in cloud.subclouds[category].items():
-            if abs(size - Lc) < 1e-6:  # Find matching size
-                subcloud = sc
-                break
-        if subcloud:
-            break
-    
-    if subcloud is None:
+    if field is None:
+        field = NumberDensityField(cloud)
+    match = np.flatnonzero(np.abs(field.Lc - Lc) < 1e-6)  # Find matching size
+    if len(match) == 0:
         return 0.0
-    
-    # Calculate mass density at this position
-    mass_density = subcloud.density([position[0], position[1], position[2]], t=0)
-    
-    # Calculate average fragment mass for this size
-    avg_mass = calculate_mass(Lc)
-    
-    # Calculate differential size distribution (dN/dL_c)
-    # From Equation (2.8): n(L_c) = -d/dL_c[N(L_c)]
-    parent_mass = 100e3  # From our simulation
-    epsilon = 1e-6
-    dN_dLc = (cumulative_distribution(Lc, parent_mass) - 
-              cumulative_distribution(Lc + epsilon, parent_mass)) / epsilon
-    
-    # Number density = mass_density / mass * dN/dLc
-    number_density = (mass_density / avg_mass) * dN_dLc
-    
-    return number_density
+    return field(position, per_bin=True)[0, match[0]]
 
-def collision_rate_along_trajectory(trajectory, cloud, hit_distance, num_points=100):
+def collision_rate_along_trajectory(trajectory, cloud, hit_distance, num_points=100, field=None):
     """
     Calculate collision rate along a trajectory using Equation (4.3): Λ(s,ℒ) = ρ_N(r,ℒ) * πℓ²
+
+    Returns the average over num_points evenly spaced λ ∈ [0, 1]; points outside the cloud
+    radius contribute zero.  Pass a prebuilt NumberDensityField to reuse it across trajectories.
     """
 
-    total_rate = 0.0
+    if field is None:
+        field = NumberDensityField(cloud)
     
     # Sample points along the trajectory
-    for i in range(num_points):
-        lambda_param = i / (num_points - 1)  # Parameter from 0 to 1
-        position = trajectory(lambda_param)
-        
-        # Only consider points inside the cloud
-        r = np.sqrt(position[0]**2 + position[1]**2 + position[2]**2)
-        if r > cloud.radius:
-            continue
-        
-        # Sum over all fragment sizes in the cloud
-        for category in cloud.subclouds:
-            for Lc, subcloud in cloud.subclouds[category].items():
-                number_density = calculate_number_density(cloud, Lc, position)
-                cross_section = np.pi * hit_distance**2
-                rate = number_density * cross_section
-                total_rate += rate
+    λ = np.linspace(0, 1, num_points)
+    positions = np.column_stack(trajectory(λ))
+    
+    # Only consider points inside the cloud
+    inside = np.linalg.norm(positions, axis=1) <= cloud.radius
+    rate = np.zeros(num_points)
+    rate[inside] = field(positions[inside]) * np.pi * hit_distance**2
     
-    return total_rate / num_points
+    return rate.sum() / num_points
 
-def impact_probability_single_trajectory(trajectory, cloud, hit_distance):
+def impact_probability_single_trajectory(trajectory, cloud, hit_distance, num_points=64, field=None, table=None):
     """
     Calculate impact probability for a single trajectory using Equation (4.2):
     P_impact(L_c, ℒ) = 1 - exp(-∫_ℒ Λ(L_c, ℒ') dℒ')
+
+    The integral runs over the actual chord of the line inside the cloud sphere with
+    num_points-node Gauss-Legendre quadrature, or is looked up from the line's impact parameter
+    when a prebuilt ImpactParameterTable is passed.
     """
 
-    # Calculate average collision rate along trajectory
-    avg_rate = collision_rate_along_trajectory(trajectory, cloud, hit_distance)
-    
-    # Estimate trajectory length through cloud (approximate as diameter)
-    trajectory_length = 2 * cloud.radius
+    if table is not None:
+        return float(table.probability(table.impact_parameters(trajectory(0), trajectory(1))[0], hit_distance))
+    if field is None:
+        field = NumberDensityField(cloud)
+    
+    # Intersect the line p1 + λ(p2 - p1) with the sphere of radius cloud.radius
+    p1 = np.array(trajectory(0), dtype=float)
+    D = np.array(trajectory(1), dtype=float) - p1
+    a, b, c = D @ D, 2 * (p1 @ D), p1 @ p1 - cloud.radius**2
+    discriminant = b**2 - 4*a*c
+    if discriminant <= 0:
+        return 0.0
+    λ_in, λ_out = (-b - np.sqrt(discriminant)) / (2*a), (-b + np.sqrt(discriminant)) / (2*a)
     
-    # Integrated rate = average_rate * length
-    integrated_rate = avg_rate * trajectory_length
+    # Gauss-Legendre nodes on the chord; ds = |D| dλ
+    nodes, weights = np.polynomial.legendre.leggauss(num_points)
+    λ = 0.5*(λ_out - λ_in)*nodes + 0.5*(λ_out + λ_in)
+    rate = field(p1 + λ[:, np.newaxis]*D) * np.pi * hit_distance**2
+    integrated_rate = 0.5*(λ_out - λ_in)*np.sqrt(a) * (weights @ rate)
     
     # Probability of at least one collision
     probability = 1 - np.exp(-integrated_rate)
     
     return probability
 
-def monte_carlo_impact_probability(cloud, hit_distance, num_trials=10000, confidence_level=0.95, use_sampling=True, sample_fraction=0.1):
+class MonteCarloSession:
+    """
+    Incremental Monte Carlo estimate of the impact probability (Equations 4.5-4.10 from cissdcm.md)
+    for one cloud and hit distance.
+
+    The fragment subsample, the spatial index and the random stream are set up once; extend(𝑛)
+    then streams 𝑛 more trials in batches of batch_size, and the hit/trial counts (hence the Wilson
+    interval) update after every batch.  run_until applies the sequential stopping rule.  Every
+    trial of a session is drawn against the same fragment subsample.
+
+    With max_hit_distance set, the kernel records each trial's nearest-fragment distance
+    (searched up to max_hit_distance) instead of a hit flag, and result(𝑑) / sweep(...) give
+    the estimate for any 𝑑 <= max_hit_distance from the same trials.
+
+    With attribute_by ("size_class" or "bin_id", a FragmentTable column) the kernel also finds
+    the nearest fragment of every label, so each trial yields a hit indicator per size class or
+    𝐿c bin; result() then carries size-resolved probabilities and Wilson intervals.  A trial can
+    hit several labels, so these do not add up to the total.
+
+    With sampler "sobol", "halton" or "stratified" the chords come from a QMCChordSampler with
+    the same distribution: every extend(𝑛) splits its trials evenly over the independently
+    randomized replicates (rounding 𝑛 up to a multiple of them), and the interval is the
+    Student-𝑡 interval p̄ ± 𝑡·sd(p_r)/√R of the replicate estimates p_r instead of the Wilson
+    interval, which would ignore the variance reduction.  Attribution keeps Wilson intervals.
+
+    With use_index=False and precision "float32" or "int16", the dense kernel sweeps a
+    CompactPositions copy of the fragments (grouped by 𝐿c bin) in float32 and refines borderline
+    pairs against the float64 cloud positions, so hits are unchanged.  The copy is held in
+    addition to the float64 positions, so it cuts the bytes swept per batch, not memory.  The
+    indexed kernel is faster than either sweep, so with use_index=True a compact precision falls
+    back to it; attribution needs the float64 kernels.
+
+    Args:
+        max_hit_distance (float): largest threshold to be evaluated (default: hit_distance only)
+        attribute_by (str): fragment label to attribute hits to (default: no attribution)
+        sampler (str): "random" (importance_sample_entry_exit_batch) or a QMCChordSampler method
+        replicates (int): randomized replicates of a QMC sampler
+        precision (str): "float64", "float32" or "int16" storage of the dense-swept fragments
+        rng (np.random.Generator): random stream for the subsample and the chords; default is
+                                   the global np.random state
+        verbose (bool): print setup and per-batch progress
+    """
+
+    def __init__(self, cloud, hit_distance, confidence_level=0.95, use_sampling=True, sample_fraction=0.1, use_index=True, batch_size=1000, memory_budget=256*2**20, rng=None, verbose=True, max_hit_distance=None, attribute_by=None, sampler="random", replicates=16, precision="float64"):
+        if use_index:
+            precision = "float64"  # the float64 VoxelGrid beats a compact dense sweep
+        if precision != "float64" and attribute_by is not None:
+            raise ValueError("hit attribution needs float64 fragment positions")
+        self.cloud = cloud
+        self.hit_distance = hit_distance
+        self.max_hit_distance = max_hit_distance
+        self.min_distances = np.empty(0) if max_hit_distance is not None else None
+        self.confidence_level = confidence_level
+        self.batch_size = batch_size
+        self.memory_budget = memory_budget
+        self.rng = np.random if rng is None else rng
+        self.verbose = verbose
+        self.hits, self.trials, self.computation_time = 0, 0, 0.0
+
+        start_time = time.time()
+        # Use sampling to reduce computational load for very large fragment counts
+        fragments_to_use = cloud.all_points
+        self.sampled = use_sampling and len(cloud.all_points) > 100000
+        indices = slice(None)
+        if self.sampled:
+            sample_size = max(int(len(cloud.all_points) * sample_fraction), 10000)
+            indices = self.rng.choice(len(cloud.all_points), sample_size, replace=False)
+            fragments_to_use = cloud.all_points[indices]
+            self._print(f"Using {len(fragments_to_use):,} sampled fragments ({sample_fraction*100:.1f}% of total)")
+        else:
+            self._print(f"Using all {len(fragments_to_use):,} fragments")
+
+        self.search_distance = max(hit_distance, max_hit_distance or 0)
+        if precision == "float64":
+            # cloud.all_points is already an (N,3) array; no conversion needed
+            self.fragment_array = np.asarray(fragments_to_use)
+            self.spatial_index = VoxelGrid(self.fragment_array, cell_size=max(self.search_distance, 1e-3)*2) if use_index else None
+        else:
+            # Compact copy of the (bin-ordered) rows; refinement reads cloud.all_points directly
+            rows = np.sort(indices) if self.sampled else None
+            bin_id = cloud.fragments.bin_id[:cloud.nInside]
+            self.fragment_array = CompactPositions(cloud.all_points, precision, rows, bin_id if rows is None else bin_id[rows])
+            self.spatial_index = None
+            self._print(f"Fragment positions stored as {precision} ({self.fragment_array.nbytes/2**20:.1f} MiB)")
+
+        # Label of every fragment in fragment_array and the hits per label so far
+        self.labels, self.label_names = None, None
+        if attribute_by is not None:
+            self.labels = np.asarray(getattr(cloud.fragments, attribute_by)[:cloud.nInside][indices], dtype=np.intp)
+            self.label_names = SIZE_CLASSES if attribute_by == "size_class" else tuple(cloud.bin_lengths.tolist())
+            if np.any(self.labels < 0):
+                raise ValueError(f"cloud has no {attribute_by} labels to attribute hits to")
+            self.label_hits = np.zeros(len(self.label_names), dtype=np.int64)
+
+        # Randomized QMC chords: hits and trials per replicate (and the replicate of every recorded trial)
+        self.chord_sampler = None
+        if sampler != "random":
+            if replicates < 2:
+                raise ValueError("QMC error estimates need at least 2 replicates")
+            seed = self.rng if isinstance(self.rng, np.random.Generator) else np.random.SeedSequence(int(self.rng.randint(2**31)))
+            self.chord_sampler = QMCChordSampler(cloud.radius, sampler, replicates, center=(0, 0, 0), rng=seed)
+            self.replicate_hits = np.zeros(replicates, dtype=np.int64)
+            self.replicate_trials = np.zeros(replicates, dtype=np.int64)
+            self.replicate_ids = np.empty(0, dtype=np.int32) if max_hit_distance is not None else None
+        self.computation_time += time.time() - start_time
+
+    def _print(self, message):
+        if self.verbose:
+            print(message)
+
+    def extend(self, n_trials):
+        """Run 𝑛 more trials (a multiple of the replicates with a QMC sampler); returns the updated result()."""
+        start_time = time.time()
+        if self.chord_sampler is None:
+            batches = [(None, min(self.batch_size, n_trials - start)) for start in range(0, n_trials, self.batch_size)]
+        else:
+            per_replicate = -(-n_trials // self.chord_sampler.replicates)
+            n_trials = per_replicate * self.chord_sampler.replicates
+            batches = [(replicate, min(self.batch_size, per_replicate - start))
+                       for replicate in range(self.chord_sampler.replicates) for start in range(0, per_replicate, self.batch_size)]
+
+        batch_start = 0
+        for replicate, n_batch in batches:
+            elapsed = time.time() - start_time
+            rate = batch_start / elapsed if elapsed > 0 else 0
+            eta = (n_trials - batch_start) / rate if rate > 0 else 0
+            self._print(f"Trial {batch_start}/{n_trials} ({100*batch_start/n_trials:.1f}%) - ETA: {eta:.1f}s")
+            batch_start += n_batch
+
+            # Generate random entry and exit points on cloud sphere
+            #chords = get_entry_exit_batch(n_batch, self.cloud.radius, center=(0, 0, 0), diameter=False, rng=self.rng)
+            with instrumentation.span("mc.chords", n=n_batch):
+                if replicate is None:
+                    chords = importance_sample_entry_exit_batch(n_batch, self.cloud.radius, center=(0, 0, 0), avoid_diameter=False, rng=self.rng)
+                else:
+                    chords = self.chord_sampler.chords(replicate, n_batch)
+            with instrumentation.span("mc.hit_kernel", n=n_batch):
+                if self.labels is not None:
+                    by_label = chord_min_distances_by_label(chords, self.fragment_array, self.labels, len(self.label_names),
+                                                            self.search_distance, self.spatial_index, self.memory_budget)
+                    self.label_hits += np.count_nonzero(by_label <= self.hit_distance, axis=0)
+                    distances = by_label.min(axis=1, initial=np.inf)
+                elif self.min_distances is not None:
+                    distances = chord_min_distances(chords, self.fragment_array, self.max_hit_distance, self.spatial_index, self.memory_budget)
+                if self.labels is None and self.min_distances is None:
+                    hit_counts = chord_hit_counts(chords, self.fragment_array, self.hit_distance, self.spatial_index, self.memory_budget)
+                else:
+                    if self.min_distances is not None:
+                        self.min_distances = np.concatenate((self.min_distances, distances))
+                    hit_counts = distances <= self.hit_distance
+            instrumentation.count("mc.trials", n_batch)
+
+            # Indicator function: 1 if any hits, 0 otherwise
+            self.hits += int(np.count_nonzero(hit_counts))
+            self.trials += n_batch
+            if replicate is not None:
+                self.replicate_hits[replicate] += np.count_nonzero(hit_counts)
+                self.replicate_trials[replicate] += n_batch
+                if self.replicate_ids is not None:
+                    self.replicate_ids = np.concatenate((self.replicate_ids, np.full(n_batch, replicate, dtype=np.int32)))
+
+        elapsed = time.time() - start_time
+        self.computation_time += elapsed
+        instrumentation.gauge("mc.trials_per_second", n_trials / elapsed if elapsed > 0 else float("inf"), workers=1)
+        return self.result()
+
+    @property
+    def probability(self):
+        return self.hits / self.trials if self.trials else 0.0
+
+    @property
+    def confidence_interval(self):
+        """Wilson score interval (Equation 4.8) of the trials so far, or the replicate interval of a QMC sampler."""
+        return self._interval(self.hits, self.replicate_hits if self.chord_sampler is not None else None)[1]
+
+    def _interval(self, hits, replicate_hits=None):
+        """(standard error, confidence interval) for hits, from the replicate spread when given."""
+        if not self.trials:
+            return 0.0, (0.0, 1.0)
+        if replicate_hits is None:
+            p_hat = hits / self.trials
+            return np.sqrt(p_hat * (1 - p_hat) / self.trials), wilson_interval(hits, self.trials, self.confidence_level)
+        estimates = replicate_hits / self.replicate_trials
+        p_bar = estimates.mean()
+        standard_error = estimates.std(ddof=1) / np.sqrt(len(estimates))
+        margin = stats.t.ppf((1 + self.confidence_level) / 2, len(estimates) - 1) * standard_error
+        return float(standard_error), (float(max(p_bar - margin, 0.0)), float(min(p_bar + margin, 1.0)))
+
+    @property
+    def relative_width(self):
+        """Interval width over the estimate (Equation 4.10); inf before the first hit."""
+        lower, upper = self.confidence_interval
+        return (upper - lower) / self.probability if self.probability > 0 else float('inf')
+
+    def required_trials(self, target_precision):
+        """
+        Total trials for relative precision target_precision at the current estimate (Equation 4.9);
+        with a QMC sampler the observed width is scaled as 1/√𝑛 instead, a conservative rate.
+        """
+        p_current = self.probability
+        if p_current <= 0:
+            return float('inf')
+        if self.chord_sampler is not None:
+            return int(self.trials * (self.relative_width / target_precision)**2)
+        z_score = stats.norm.ppf((1 + self.confidence_level) / 2)
+        return int((z_score**2 * (1 - p_current)) / (p_current * target_precision**2))
+
+    def run_until(self, target_precision=0.05, max_trials=100000, initial_batch=1000, max_step=5000):
+        """
+        Sequential refinement: extend until the relative interval width drops below
+        target_precision (Equation 4.10) or max_trials is reached, adding at most max_step
+        trials per step towards the Equation (4.9) sample size.
+        """
+        if self.trials < initial_batch:
+            self.extend(min(initial_batch, max_trials) - self.trials)
+        while self.trials < max_trials:
+            instrumentation.gauge("mc.adaptive_relative_width", self.relative_width, trials=self.trials)
+            if self.relative_width < target_precision:
+                self._print(f"Converged after {self.trials} trials")
+                break
+
+            additional_trials = min(self.required_trials(target_precision) - self.trials, max_step, max_trials - self.trials)
+            if additional_trials <= 0:
+                break
+            self._print(f"Adding {additional_trials} more trials...")
+            self.extend(int(additional_trials))
+        return self.result()
+
+    def result(self, hit_distance=None):
+        """Estimate at hit_distance (default: the session's); other thresholds need max_hit_distance."""
+        hits = self.hits
+        primary = hit_distance is None or hit_distance == self.hit_distance
+        if not primary:
+            if self.min_distances is None or hit_distance > self.max_hit_distance:
+                raise ValueError(f"hit distance {hit_distance} is beyond what this session recorded (max_hit_distance={self.max_hit_distance})")
+            hits = int(np.count_nonzero(self.min_distances <= hit_distance))
+        replicate_hits = None
+        if self.chord_sampler is not None:
+            replicate_hits = self.replicate_hits if primary else np.bincount(self.replicate_ids[self.min_distances <= hit_distance],
+                                                                             minlength=self.chord_sampler.replicates)
+
+        # With a fragment subsample the probability is not rescaled: hits on unsampled fragments
+        # are missed, so this is a conservative estimate - the actual probability could be higher
+        probability_estimate = hits / self.trials if self.trials else 0.0
+        # Standard error and confidence interval (Equations 4.7-4.8)
+        standard_error, confidence_interval = self._interval(hits, replicate_hits)
+        return {
+            'probability': probability_estimate,
+            'hits': hits,
+            'trials': self.trials,
+            'confidence_interval': confidence_interval,
+            'confidence_level': self.confidence_level,
+            'standard_error': standard_error,
+            **({'sampler': self.chord_sampler.method, 'replicates': self.chord_sampler.replicates} if self.chord_sampler is not None else {}),
+            'computation_time': self.computation_time,
+            'fragments_used': len(self.fragment_array),
+            **({'attribution': self.attribution()} if self.labels is not None and primary else {})
+        }
+
+    def attribution(self):
+        """Per-label probability, hits and Wilson interval at the session's hit distance."""
+        return {name: {'probability': hits / self.trials if self.trials else 0.0,
+                       'hits': hits,
+                       'confidence_interval': wilson_interval(hits, self.trials, self.confidence_level) if self.trials else (0.0, 1.0)}
+                for name, hits in zip(self.label_names, self.label_hits.tolist())}
+
+    def sweep(self, hit_distances):
+        """result(𝑑) for every 𝑑 in hit_distances, all from the same trials."""
+        return {d: self.result(d) for d in hit_distances}
+
+def monte_carlo_impact_probability(cloud, hit_distance, num_trials=10000, confidence_level=0.95, use_sampling=True, sample_fraction=0.1, use_index=True, batch_size=1000, memory_budget=256*2**20, attribute_by=None, sampler="random", replicates=16, precision="float64"):
     """
     Monte Carlo estimation of impact probability using Equations (4.5)-(4.8) from cissdcm.md
     Optimized version with spatial sampling and vectorized operations
+
+    Trials are processed in batches of batch_size chords.  With use_index the fragments are
+    bucketed once into a VoxelGrid and each chord only tests the voxels around it (any-hit
+    query), which makes full clouds (use_sampling=False) cheap; otherwise every batch goes
+    through count_points_near_lines_batched within memory_budget bytes of temporaries.
+    A one-shot MonteCarloSession; attribute_by adds its size-resolved 'attribution', and sampler
+    ("sobol", "halton", "stratified") swaps in randomized QMC chords with replicate error bars.
+    With use_index=False, precision ("float32", "int16") sweeps a compact copy of the fragments.
     """
 
     print(f"Starting Monte Carlo simulation with {num_trials} trials...")
-    start_time = time.time()
-    
-    # Use sampling to reduce computational load for very large fragment counts
-    fragments_to_use = cloud.all_points
-    if use_sampling and len(cloud.all_points) > 100000:
-        sample_size = max(int(len(cloud.all_points) * sample_fraction), 10000)
-        indices = np.random.choice(len(cloud.all_points), sample_size, replace=False)
-        fragments_to_use = [cloud.all_points[i] for i in indices]
-        print(f"Using {len(fragments_to_use):,} sampled fragments ({sample_fraction*100:.1f}% of total)")
-    else:
-        print(f"Using all {len(fragments_to_use):,} fragments")
-    
-    # Convert to numpy array for vectorized operations
-    fragment_array = np.array(fragments_to_use)
-    
-    hits = 0
-    
-    for trial in range(num_trials):
-        if trial % 1000 == 0:
-            elapsed = time.time() - start_time
-            rate = trial / elapsed if elapsed > 0 else 0
-            eta = (num_trials - trial) / rate if rate > 0 else 0
-            print(f"Trial {trial}/{num_trials} ({100*trial/num_trials:.1f}%) - ETA: {eta:.1f}s")
-        
-        # Generate random entry and exit points on cloud sphere
-        #p1, p2 = get_entry_exit(cloud.radius, center=(0, 0, 0), diameter=False)
-        p1, p2 = importance_sample_entry_exit(cloud.radius, center=(0, 0, 0), avoid_diameter=False)
-        trajectory = line_parametric_3d(p1, p2)
-        
-        # Optimized hit detection using vectorized operations
-        hit_count = count_points_near_line_optimized(trajectory, fragment_array, hit_distance)
-        
-        # Indicator function: 1 if any hits, 0 otherwise
-        if hit_count > 0:
-            hits += 1
-    
-    # Scale up probability if we used sampling
-    probability_estimate = hits / num_trials
-    if use_sampling and len(cloud.all_points) > 100000:
-        # The probability remains the same, but we need to account for the fact that 
-        # we may have missed some hits due to sampling
-        # This is a conservative estimate - the actual probability could be higher
-        pass
-    
-    # Calculate variance and confidence interval (Equations 4.7-4.8)
-    variance = probability_estimate * (1 - probability_estimate) / num_trials
-    std_error = np.sqrt(variance)
-    
-    # Wilson score confidence interval
+    session = MonteCarloSession(cloud, hit_distance, confidence_level, use_sampling, sample_fraction, use_index, batch_size, memory_budget,
+                                attribute_by=attribute_by, sampler=sampler, replicates=replicates, precision=precision)
+    return session.extend(num_trials)
+
+def monte_carlo_sensitivity(cloud, hit_distances, num_trials=5000, confidence_level=0.95, use_sampling=True, sample_fraction=0.1, use_index=True, batch_size=1000, memory_budget=256*2**20, rng=None):
+    """
+    Impact probability for several hit distances from one set of trials.
+
+    Each chord's nearest-fragment distance is computed once (up to the largest threshold), so
+    the whole sweep costs about one monte_carlo_impact_probability run.
+
+    Returns:
+        dict: hit distance -> result dict of monte_carlo_impact_probability
+    """
+    print(f"Starting Monte Carlo sensitivity sweep over {len(hit_distances)} hit distances with {num_trials} trials...")
+    session = MonteCarloSession(cloud, min(hit_distances), confidence_level, use_sampling, sample_fraction, use_index, batch_size, memory_budget,
+                                rng=rng, max_hit_distance=max(hit_distances))
+    session.extend(num_trials)
+    return session.sweep(hit_distances)
+
+def wilson_interval(hits, n, confidence_level=0.95):
+    """Wilson score confidence interval (Equation 4.8) for hits out of n trials."""
     z_score = stats.norm.ppf((1 + confidence_level) / 2)
-    
-    # Wilson score interval (Equation 4.8)
-    n = num_trials
-    p_hat = probability_estimate
+    p_hat = hits / n
     
     denominator = 1 + z_score**2 / n
     center = (p_hat + z_score**2 / (2*n)) / denominator
     margin = z_score * np.sqrt(p_hat*(1-p_hat)/n + z_score**2/(4*n**2)) / denominator
     
-    confidence_lower = center - margin
-    confidence_upper = center + margin
-    
-    computation_time = time.time() - start_time
-    
-    return {
-        'probability': probability_estimate,
-        'hits': hits,
-        'trials': num_trials,
-        'confidence_interval': (confidence_lower, confidence_upper),
-        'confidence_level': confidence_level,
-        'standard_error': std_error,
-        'computation_time': computation_time,
-        'fragments_used': len(fragments_to_use)
-    }
+    return center - margin, center + margin
+
+def chord_hit_counts(chords, fragment_array, hit_distance, spatial_index=None, memory_budget=256*2**20):
+    """Per-chord hit counts for a (𝑛,2,3) array of entry/exit points (any-hit 0/1 when indexed)."""
+    if spatial_index is not None:
+        return np.array([spatial_index.count_near_line(p1, p2, hit_distance, any_hit=True) for p1, p2 in chords], dtype=np.int64)
+    if isinstance(fragment_array, CompactPositions):
+        return count_points_near_lines_compact(chords[:, 0], chords[:, 1], fragment_array, hit_distance, memory_budget)
+    return count_points_near_lines_batched(chords[:, 0], chords[:, 1], fragment_array, hit_distance, memory_budget)
+
+def chord_min_distances(chords, fragment_array, max_distance, spatial_index=None, memory_budget=256*2**20):
+    """
+    Per-chord distance to the nearest fragment for a (𝑛,2,3) array of entry/exit points.
+
+    With a spatial index only fragments within max_distance are searched and farther chords
+    get inf; either way min_distance <= 𝑑 is the hit indicator for any threshold 𝑑 <= max_distance.
+    """
+    if spatial_index is not None:
+        return np.array([spatial_index.nearest_to_line(p1, p2, max_distance) for p1, p2 in chords], dtype=np.float64)
+    if isinstance(fragment_array, CompactPositions):
+        return min_distances_to_lines_compact(chords[:, 0], chords[:, 1], fragment_array, memory_budget)
+    return min_distances_to_lines_batched(chords[:, 0], chords[:, 1], fragment_array, memory_budget)
+
+def chord_min_distances_by_label(chords, fragment_array, labels, n_labels, max_distance, spatial_index=None, memory_budget=256*2**20):
+    """
+    chord_min_distances separately for every fragment label (size class, 𝐿c bin, ...).
+
+    Returns:
+        np.ndarray: (𝑛, n_labels) nearest-fragment distance of each chord within each label
+    """
+    labels = np.asarray(labels)
+    if spatial_index is not None:
+        return np.array([spatial_index.nearest_to_line_by_label(p1, p2, max_distance, labels, n_labels) for p1, p2 in chords], dtype=np.float64).reshape(len(chords), n_labels)
+
+    # Sweep the fragments of one label at a time
+    order = slice(None) if np.all(labels[:-1] <= labels[1:]) else np.argsort(labels, kind="stable")
+    points, labels = fragment_array[order], labels[order]
+    bounds = np.searchsorted(labels, np.arange(n_labels + 1))
+    distances = np.full((len(chords), n_labels), np.inf)
+    for label in np.flatnonzero(np.diff(bounds)):
+        distances[:, label] = min_distances_to_lines_batched(chords[:, 0], chords[:, 1], points[bounds[label]:bounds[label + 1]], memory_budget)
+    return distances
 
 def count_points_near_line_optimized(line_func, points_array, distance_threshold):
     """
@@ -216,141 +597,418 @@ def count_points_near_line_optimized(line_func, points_array, distance_threshold
     # Count points within threshold
     return np.sum(distances <= distance_threshold)
 
-def adaptive_monte_carlo(cloud, hit_distance, target_precision=0.05, max_trials=100000):
+def count_points_near_lines_batched(p1s, p2s, points_array, distance_threshold, memory_budget=256*2**20):
+    """
+    Batched count_points_near_line_optimized: hit counts of many (infinite) lines in one call.
+
+    Each line is re-anchored at its point closest to the origin, 𝑐 (so 𝑐·𝑢 = 0), giving
+    𝑑² = |𝑥|² - 2𝑥·𝑐 + |𝑐|² - (𝑥·𝑢)²; the fragments are then swept in chunks whose
+    (fragment-chunk × lines) matrices fit in memory_budget bytes.
+
+    Args:
+        p1s, p2s (np.ndarray): (𝐶,3) entry and exit points of 𝐶 lines
+        points_array (np.ndarray): (𝑁,3) fragment positions
+        distance_threshold (float): hit distance
+        memory_budget (int): approximate bytes of temporaries per chunk
+
+    Returns:
+        np.ndarray: (𝐶,) number of fragments within distance_threshold of each line
+    """
+
+    p1s = np.asarray(p1s, dtype=np.float64).reshape(-1, 3)
+    u = np.asarray(p2s, dtype=np.float64).reshape(-1, 3) - p1s
+    u /= np.linalg.norm(u, axis=1)[:, np.newaxis]
+    c = p1s - np.einsum("ij,ij->i", p1s, u)[:, np.newaxis]*u
+    c_sq = np.einsum("ij,ij->i", c, c)
+
+    counts = np.zeros(len(p1s), dtype=np.int64)
+    if len(points_array) == 0 or len(p1s) == 0:
+        return counts
+
+    # ~4 float64 (chunk × 𝐶) temporaries live at once
+    n_lines = len(p1s)
+    chunk = max(int(memory_budget // (32*n_lines)), 1)
+    threshold_sq = distance_threshold**2
+    for start in range(0, len(points_array), chunk):
+        x = np.asarray(points_array[start:start + chunk], dtype=np.float64)
+        x_sq = np.einsum("ij,ij->i", x, x)[:, np.newaxis]
+        along = x @ u.T
+        d_sq = x_sq - 2*(x @ c.T) + c_sq
+        d_sq -= along*along
+        counts += np.count_nonzero(d_sq <= threshold_sq, axis=0)
+    return counts
+
+def min_distances_to_lines_batched(p1s, p2s, points_array, memory_budget=256*2**20):
+    """
+    Distance from each of many (infinite) lines to its nearest fragment, with the same
+    re-anchored expansion and chunking as count_points_near_lines_batched.
+
+    Returns:
+        np.ndarray: (𝐶,) nearest-fragment distances (inf without fragments)
+    """
+
+    p1s = np.asarray(p1s, dtype=np.float64).reshape(-1, 3)
+    u = np.asarray(p2s, dtype=np.float64).reshape(-1, 3) - p1s
+    u /= np.linalg.norm(u, axis=1)[:, np.newaxis]
+    c = p1s - np.einsum("ij,ij->i", p1s, u)[:, np.newaxis]*u
+    c_sq = np.einsum("ij,ij->i", c, c)
+
+    min_sq = np.full(len(p1s), np.inf)
+    if len(points_array) == 0 or len(p1s) == 0:
+        return min_sq
+
+    n_lines = len(p1s)
+    chunk = max(int(memory_budget // (32*n_lines)), 1)
+    for start in range(0, len(points_array), chunk):
+        x = np.asarray(points_array[start:start + chunk], dtype=np.float64)
+        x_sq = np.einsum("ij,ij->i", x, x)[:, np.newaxis]
+        along = x @ u.T
+        d_sq = x_sq - 2*(x @ c.T) + c_sq
+        d_sq -= along*along
+        np.minimum(min_sq, d_sq.min(axis=0), out=min_sq)
+    return np.sqrt(np.maximum(min_sq, 0))
+
+def _compact_sweep(p1s, p2s, compact, memory_budget):
+    """
+    Float32 squared line distances of a CompactPositions store, one chunk at a time.
+
+    Yields (start, d², 𝑡, 𝑒, exact_sq): the (chunk × 𝐶) float32 expansion of
+    count_points_near_lines_batched, a per-line bound 𝑡 on its rounding error, the bound 𝑒 on
+    the decoded positions' error, and the float64 squared distance for (row, line) index pairs.
+    """
+    p1s = np.asarray(p1s, dtype=np.float64).reshape(-1, 3)
+    u = np.asarray(p2s, dtype=np.float64).reshape(-1, 3) - p1s
+    u /= np.linalg.norm(u, axis=1)[:, np.newaxis]
+    c = p1s - np.einsum("ij,ij->i", p1s, u)[:, np.newaxis]*u
+    c32, u32 = c.astype(np.float32), u.astype(np.float32)
+    c_sq = np.einsum("ij,ij->i", c32, c32)
+    # One (3 × 2𝐶) right-hand side gives both 𝑥·𝑐 and 𝑥·𝑢
+    rhs = np.ascontiguousarray(np.vstack((-2*c32, u32)).T)
+    # Each term of the expansion is at most (|𝑥| + |𝑐|)²; a few dozen ulps cover the float32 arithmetic
+    arithmetic = 2.0**-19 * (compact.max_norm + np.sqrt(np.einsum("ij,ij->i", c, c)))**2
+
+    def exact_sq(rows, lines):
+        v = compact.exact_rows(rows) - c[lines]
+        along = np.einsum("ij,ij->i", v, u[lines])
+        return np.einsum("ij,ij->i", v, v) - along*along
+
+    # ~4 float32 (chunk × 𝐶) temporaries live at once
+    chunk = max(int(memory_budget // (16*len(p1s))), 1)
+    for start in range(0, len(compact), chunk):
+        x, error = compact.decode(start, start + chunk)
+        products = x @ rhs
+        d_sq, along = products[:, :len(c)], products[:, len(c):]
+        d_sq += np.einsum("ij,ij->i", x, x)[:, np.newaxis]
+        d_sq += c_sq
+        along *= along
+        d_sq -= along
+        yield start, d_sq, arithmetic, error, exact_sq
+
+def count_points_near_lines_compact(p1s, p2s, compact, distance_threshold, memory_budget=256*2**20):
+    """
+    count_points_near_lines_batched on a CompactPositions store, with the same results.
+
+    The sweep runs in float32 on the compact positions; pairs whose approximate distance is
+    within the error bounds of distance_threshold are recomputed in float64 from the exact
+    positions, so only a thin shell of candidates around each line touches the float64 data.
+    """
+    counts = np.zeros(len(np.atleast_2d(p1s)), dtype=np.int64)
+    for start, d_sq, arithmetic, error, exact_sq in _compact_sweep(p1s, p2s, compact, memory_budget):
+        certain = np.where(distance_threshold > error, (distance_threshold - error)**2, -np.inf) - arithmetic
+        possible = (distance_threshold + error)**2 + arithmetic
+        # Pairs within reach are few (a thin tube per line); settle them pair by pair
+        rows, lines = np.nonzero(d_sq <= np.nextafter(possible.astype(np.float32), np.float32(np.inf)))
+        near = d_sq[rows, lines]
+        sure = near <= certain[lines]
+        refined = exact_sq(start + rows[~sure], lines[~sure]) <= distance_threshold**2
+        counts += np.bincount(lines[sure], minlength=len(counts)) + np.bincount(lines[~sure][refined], minlength=len(counts))
+    return counts
+
+def min_distances_to_lines_compact(p1s, p2s, compact, memory_budget=256*2**20):
+    """
+    min_distances_to_lines_batched on a CompactPositions store, with the same results.
+
+    A chunk's float32 minimum bounds the true one; only pairs that could still undercut it (or
+    the best refined distance so far) are recomputed in float64.
+    """
+    best_sq = np.full(len(np.atleast_2d(p1s)), np.inf)
+    for start, d_sq, arithmetic, error, exact_sq in _compact_sweep(p1s, p2s, compact, memory_budget):
+        if len(d_sq) == 0:
+            continue
+        # Upper bound of the chunk's exact minimum, then every pair whose lower bound is below it
+        upper = np.minimum(best_sq, (np.sqrt(np.maximum(d_sq.min(axis=0) + arithmetic, 0)) + error)**2)
+        reach = (np.sqrt(upper) + error)**2 + arithmetic
+        rows, lines = np.nonzero(d_sq <= np.nextafter(reach.astype(np.float32), np.float32(np.inf)))
+        np.minimum.at(best_sq, lines, exact_sq(start + rows, lines))
+    return np.sqrt(np.maximum(best_sq, 0))
+
+class StreamHitCounter:
+    """
+    stream_cloud reducer: per-chord hit counts over a fragment stream, for clouds too large
+    to hold in memory.  Only inside fragments count, like cloud.all_points.
+    """
+
+    def __init__(self, chords, hit_distance, memory_budget=64*2**20):
+        self.chords = np.asarray(chords, dtype=float).reshape(-1, 2, 3)
+        self.hit_distance = hit_distance
+        self.memory_budget = memory_budget
+        self.counts = np.zeros(len(self.chords), dtype=np.int64)
+
+    def update(self, sub_cloud, chunk):
+        points = chunk.pos[chunk.inside]
+        self.counts += count_points_near_lines_batched(self.chords[:, 0], self.chords[:, 1], points, self.hit_distance, self.memory_budget)
+
+    def result(self):
+        return self.counts
+
+# Per-process state of parallel Monte Carlo workers (set by _init_mc_worker)
+_mc_worker = {}
+
+def _to_shared(array):
+    """Copy array into a new SharedMemory segment; returns (segment, spec) for _attach_shared."""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+def _attach_shared(spec):
+    """(segment, array view) of a segment created by _to_shared."""
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+def _init_mc_worker(points_spec, grid_spec=None):
+    """
+    Attach the shared fragment array (the grid-sorted points when indexed) and, with grid_spec
+    = (origin, cell_size, shape, cell_start spec), the parent's VoxelGrid over it.
+    """
+    shm, fragment_array = _attach_shared(points_spec)
+    _mc_worker['segments'] = [shm]
+    _mc_worker['fragment_array'] = fragment_array
+    _mc_worker['spatial_index'] = None
+    if grid_spec is not None:
+        origin, cell_size, shape, cell_start_spec = grid_spec
+        cell_shm, cell_start = _attach_shared(cell_start_spec)
+        _mc_worker['segments'].append(cell_shm)
+        _mc_worker['spatial_index'] = VoxelGrid.from_arrays(origin, cell_size, shape, fragment_array, cell_start)
+
+def _mc_block_hits(radius, hit_distance, n_trials, seed_seq, memory_budget, fragment_array=None, spatial_index=None):
+    """Hits of one block of trials drawn from its own SeedSequence stream."""
+    if fragment_array is None:
+        fragment_array, spatial_index = _mc_worker['fragment_array'], _mc_worker['spatial_index']
+    rng = np.random.default_rng(seed_seq)
+    chords = importance_sample_entry_exit_batch(n_trials, radius, center=(0, 0, 0), avoid_diameter=False, rng=rng)
+    return int(np.count_nonzero(chord_hit_counts(chords, fragment_array, hit_distance, spatial_index, memory_budget)))
+
+class ParallelMonteCarloSession(MonteCarloSession):
+    """
+    MonteCarloSession whose trials run on a process pool.
+
+    The fragment subsample, the VoxelGrid, their shared-memory segments and the pool are set up
+    once and kept until close() (or the end of a with block), so extend(𝑛) only ships blocks of
+    trials to the workers and run_until refines without repeating any setup.  Trials are cut
+    into fixed blocks of block_size, and the session's 𝑖-th block always draws its chords from
+    child 𝑖 of SeedSequence(seed); hit totals are integer sums, so a given seed gives the same
+    hits and interval for any n_workers.  The fragment array (with use_index, the VoxelGrid built
+    once in the parent: its cell-sorted points and cell_start) is placed in shared memory and
+    attached by each worker instead of being pickled per task or copied per worker.
+
+    Args:
+        seed (int | np.random.SeedSequence): root seed; fresh entropy when None
+        n_workers (int): worker processes (default: os.cpu_count()); 1 runs in-process
+        block_size (int): trials per task / per random stream
+    """
+
+    def __init__(self, cloud, hit_distance, seed=None, n_workers=None, block_size=1000, confidence_level=0.95, use_sampling=False, sample_fraction=0.1, use_index=True, memory_budget=64*2**20, verbose=True):
+        self.root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        sample_seed, self.trial_seed = self.root.spawn(2)
+        super().__init__(cloud, hit_distance, confidence_level, use_sampling, sample_fraction, use_index, block_size, memory_budget,
+                         rng=np.random.default_rng(sample_seed), verbose=verbose)
+
+        start_time = time.time()
+        self.block_size = block_size
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.pool, self.segments = None, []
+        if self.n_workers > 1:
+            # The grid is built once here; workers attach its sorted points and cell_start
+            try:
+                shm, points_spec = _to_shared(self.fragment_array if self.spatial_index is None else self.spatial_index.points)
+                self.segments.append(shm)
+                grid_spec = None
+                if self.spatial_index is not None:
+                    shm, cell_start_spec = _to_shared(self.spatial_index.cell_start)
+                    self.segments.append(shm)
+                    grid_spec = (self.spatial_index.origin, self.spatial_index.cell_size, self.spatial_index.shape, cell_start_spec)
+                self.pool = Pool(self.n_workers, initializer=_init_mc_worker, initargs=(points_spec, grid_spec))
+            except BaseException:
+                self.close()
+                raise
+        self.computation_time += time.time() - start_time
+
+    def extend(self, n_trials):
+        """Run 𝑛 more trials on the pool; returns the updated result()."""
+        start_time = time.time()
+        block_sizes = [min(self.block_size, n_trials - start) for start in range(0, n_trials, self.block_size)]
+        tasks = [(self.cloud.radius, self.hit_distance, n, seed_seq, self.memory_budget)
+                 for n, seed_seq in zip(block_sizes, self.trial_seed.spawn(len(block_sizes)))]
+        self._print(f"Starting parallel Monte Carlo: {n_trials} trials in {len(tasks)} blocks on {self.n_workers} workers, {len(self.fragment_array):,} fragments")
+
+        if self.pool is None:
+            block_hits = [_mc_block_hits(*task, fragment_array=self.fragment_array, spatial_index=self.spatial_index) for task in tasks]
+        else:
+            block_hits = self.pool.starmap(_mc_block_hits, tasks)
+        self.hits += sum(block_hits)
+        self.trials += n_trials
+
+        elapsed = time.time() - start_time
+        self.computation_time += elapsed
+        instrumentation.count("mc.trials", n_trials)
+        instrumentation.gauge("mc.trials_per_second", n_trials / elapsed if elapsed > 0 else float("inf"), workers=self.n_workers)
+        return self.result()
+
+    def result(self, hit_distance=None):
+        return {**super().result(hit_distance), 'seed': self.root.entropy, 'workers': self.n_workers}
+
+    def close(self):
+        """Shut the pool down and release the shared-memory segments."""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        for shm in self.segments:
+            shm.close()
+            shm.unlink()
+        self.segments = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def parallel_monte_carlo_impact_probability(cloud, hit_distance, num_trials=100000, seed=None, n_workers=None, block_size=1000, confidence_level=0.95, use_sampling=False, sample_fraction=0.1, use_index=True, memory_budget=64*2**20):
+    """
+    Process-pool version of monte_carlo_impact_probability: one ParallelMonteCarloSession
+    extended by num_trials, so a given seed gives the same hits for any n_workers.
+    """
+    with ParallelMonteCarloSession(cloud, hit_distance, seed, n_workers, block_size, confidence_level, use_sampling, sample_fraction, use_index, memory_budget) as session:
+        return session.extend(num_trials)
+
+def adaptive_monte_carlo(cloud, hit_distance, target_precision=0.05, max_trials=100000, n_workers=None, seed=None, confidence_level=0.95):
     """
     Adaptive sampling with sequential refinement (Equations 4.9-4.10 from cissdcm.md)
+
+    One MonteCarloSession (with n_workers set, a ParallelMonteCarloSession whose pool and shared
+    fragments live for the whole run) is extended step by step, so setup happens once and every
+    step uses the same fragment subsample.  With a seed the sequence of estimates is reproducible.
     """
     initial_batch = 1000
     print(f"Starting adaptive Monte Carlo with target precision {target_precision*100}%...")
-    
-    # Initial batch
-    result = monte_carlo_impact_probability(cloud, hit_distance, initial_batch)
-    
-    current_trials = initial_batch
-    while current_trials < max_trials:
-        # Check convergence (Equation 4.10)
-        interval_width = result['confidence_interval'][1] - result['confidence_interval'][0]
-        relative_width = interval_width / result['probability'] if result['probability'] > 0 else float('inf')
-        
-        if relative_width < target_precision:
-            print(f"Converged after {current_trials} trials")
-            break
-        
-        # Calculate required sample size (Equation 4.9)
-        z_score = 1.96  # 95% confidence
-        p_current = result['probability']
-        required_trials = int((z_score**2 * (1 - p_current)) / (p_current * target_precision**2))
-        
-        # Add more trials
-        additional_trials = min(required_trials - current_trials, 5000)
-        if additional_trials > 0:
-            print(f"Adding {additional_trials} more trials...")
-            additional_result = monte_carlo_impact_probability(cloud, hit_distance, additional_trials)
-            
-            # Combine results
-            total_hits = result['hits'] + additional_result['hits']
-            current_trials += additional_trials
-            
-            result['probability'] = total_hits / current_trials
-            result['hits'] = total_hits
-            result['trials'] = current_trials
-            
-            # Recalculate confidence interval
-            p_hat = result['probability']
-            n = current_trials
-            z_score = 1.96
-            
-            denominator = 1 + z_score**2 / n
-            center = (p_hat + z_score**2 / (2*n)) / denominator
-            margin = z_score * np.sqrt(p_hat*(1-p_hat)/n + z_score**2/(4*n**2)) / denominator
-            
-            result['confidence_interval'] = (center - margin, center + margin)
-        else:
-            break
-    
-    return result
+    if n_workers is None:
+        session = MonteCarloSession(cloud, hit_distance, confidence_level, rng=None if seed is None else np.random.default_rng(seed))
+        return session.run_until(target_precision, max_trials, initial_batch)
+    with ParallelMonteCarloSession(cloud, hit_distance, seed, n_workers, confidence_level=confidence_level) as session:
+        return session.run_until(target_precision, max_trials, initial_batch)
 
-def main(parent_mass: "kilograms", parent_radius: "meters", hit_distances: list = [0.5, 1.0, 2.0, 5.0]) -> None:
-    """Main function implementing Section 4 of cissdcm.md"""
-    
-    print("#" * 60)
-    print("IMPACT PROBABILITY AT EVENT ZERO")
-    print("Monte Carlo Implementation of Collision Probability Analysis")
-    print("#" * 60)
-    
-    # Initiate hit distance
-    hit_distance = 1.0   # meters
-    
-    print(f"\nCreating debris cloud...")
-    print(f"Parent mass: {parent_mass:.0f} kg")
-    print(f"Parent radius: {parent_radius} m") 
-    print(f"Hit distance threshold: {hit_distance} m")
-    
-    start_time = time.time()
-    cloud = Cloud(parent_mass, parent_radius)
-    creation_time = time.time() - start_time
-    
-    print(f"\nCloud created in {creation_time:.2f} seconds")
-    print(f"Total fragments: {len(cloud.all_points):,}")
-    print(f"Cloud radius: {cloud.radius:.2f} m")
-    
-    # Fragment distribution by category (only fragments inside cloud radius)
-    small_count = 0
-    medium_count = 0
-    large_count = 0
-    
-    # Count fragments that are actually inside the cloud radius
-    for category in cloud.subclouds:
-        for Lc, subcloud in cloud.subclouds[category].items():
-            inside_fragments = [frag for frag in subcloud.fragments if np.linalg.norm(frag.pos) <= subcloud.radius]
-            if category == 'small':
-                small_count += len(inside_fragments)
-            elif category == 'medium':
-                medium_count += len(inside_fragments)
-            elif category == 'large':
-                large_count += len(inside_fragments)
-    
-    print(f"\nFragment distribution (inside cloud radius only):")
-    print(f"  Small fragments (< 8 cm):  {small_count:,} ({100*small_count/len(cloud.all_points):.3f}%)")
-    print(f"  Medium fragments (8-11 cm): {medium_count:,} ({100*medium_count/len(cloud.all_points):.3f}%)")
-    print(f"  Large fragments (> 11 cm):  {large_count:,} ({100*large_count/len(cloud.all_points):.3f}%)")
-    
-    # Monte Carlo impact probability calculation
-    print(f"\n" + "#"*60)
-    print("MONTE CARLO IMPACT PROBABILITY CALCULATION")
-    print("#"*60)
-    
-    # Standard Monte Carlo
-    print(f"\n1. Standard Monte Carlo Estimation:")
-    result_standard = monte_carlo_impact_probability(cloud, hit_distance, num_trials=10000, use_sampling=True, sample_fraction=0.05)
-    
-    print(f"\nResults:")
-    print(f"  Impact Probability: {result_standard['probability']:.6f}")
-    print(f"  Hits: {result_standard['hits']:,} out of {result_standard['trials']:,} trials")
-    print(f"  Fragments Used: {result_standard['fragments_used']:,} ({100*result_standard['fragments_used']/len(cloud.all_points):.1f}% of total)")
-    print(f"  95% Confidence Interval: [{result_standard['confidence_interval'][0]:.6f}, {result_standard['confidence_interval'][1]:.6f}]")
-    print(f"  Standard Error: {result_standard['standard_error']:.6f}")
-    print(f"  Computation Time: {result_standard['computation_time']:.2f} seconds")
-    
-    # Adaptive Monte Carlo
-    print(f"\n2. Adaptive Monte Carlo with Sequential Refinement:")
-    result_adaptive = adaptive_monte_carlo(cloud, hit_distance, target_precision=0.05)
-    
-    print(f"\nAdaptive Results:")
-    print(f"  Impact Probability: {result_adaptive['probability']:.6f}")
-    print(f"  Hits: {result_adaptive['hits']:,} out of {result_adaptive['trials']:,} trials")
-    print(f"  95% Confidence Interval: [{result_adaptive['confidence_interval'][0]:.6f}, {result_adaptive['confidence_interval'][1]:.6f}]")
-    print(f"  Total Computation Time: {result_adaptive['computation_time']:.2f} seconds")
-    
-    # Compare different hit distances
-    print(f"\n3. Sensitivity Analysis - Different Hit Distances:")    
-    for hd in hit_distances:
-        result = monte_carlo_impact_probability(cloud, hd, num_trials=5000)
-        print(f"  Hit distance {hd:3.1f} m: P = {result['probability']:.6f} ± {result['standard_error']:.6f}")
+def main(parent_mass: "kilograms", parent_radius: "meters", hit_distances: list = [0.5, 1.0, 2.0, 5.0], cloud_path: str = None, trace_path: str = None) -> None:
+    """
+    Main function implementing Section 4 of cissdcm.md
+
+    With cloud_path, a cloud previously saved there is memory-mapped instead of rebuilt (a
+    ValueError if its header records another parent mass, radius or breakup type); otherwise
+    the new cloud is saved to it for the next run.  With trace_path, spans, counters
+    and gauges of the run are appended there as JSON lines.
+    """
     
-    print(f"\n" + "#"*60)
-    print("ANALYSIS COMPLETE")
-    print("#"*60)
+    trace_sink = instrumentation.JSONLinesSink(trace_path) if trace_path is not None else None
+    if trace_sink is not None:
+        instrumentation.enable(trace_sink)
+    try:
+        print("#" * 60)
+        print("IMPACT PROBABILITY AT EVENT ZERO")
+        print("Monte Carlo Implementation of Collision Probability Analysis")
+        print("#" * 60)
+    
+        # Initiate hit distance
+        hit_distance = 1.0   # meters
+    
+        print(f"\nCreating debris cloud...")
+        print(f"Parent mass: {parent_mass:.0f} kg")
+        print(f"Parent radius: {parent_radius} m") 
+        print(f"Hit distance threshold: {hit_distance} m")
+    
+        start_time = time.time()
+        with instrumentation.span("main.cloud"):
+            if cloud_path is not None and os.path.exists(os.path.join(cloud_path, HEADER_FILE)):
+                cloud = load_cloud(cloud_path)
+                saved = (cloud.parent_mass, cloud.parent_radius, cloud.breakup_type)
+                if not (np.isclose(saved[0], parent_mass) and np.isclose(saved[1], parent_radius) and saved[2] == "collision"):
+                    raise ValueError(f"Cloud at {cloud_path} was built for parent_mass={saved[0]:g} kg, parent_radius={saved[1]:g} m, "
+                                     f"breakup_type={saved[2]!r}; remove it or pass another cloud_path")
+            else:
+                cloud = Cloud(parent_mass, parent_radius)
+                if cloud_path is not None:
+                    save_cloud(cloud, cloud_path)
+        creation_time = time.time() - start_time
+    
+        print(f"\nCloud created in {creation_time:.2f} seconds")
+        print(f"Total fragments: {len(cloud.all_points):,}")
+        print(f"Cloud radius: {cloud.radius:.2f} m")
+    
+        # Fragment distribution by category (only fragments inside cloud radius)
+        inside = cloud.fragments[:cloud.nInside]
+        small_count, medium_count, large_count = np.bincount(inside.size_class, minlength=len(SIZE_CLASSES))
+    
+        print(f"\nFragment distribution (inside cloud radius only):")
+        print(f"  Small fragments (< 8 cm):  {small_count:,} ({100*small_count/len(cloud.all_points):.3f}%)")
+        print(f"  Medium fragments (8-11 cm): {medium_count:,} ({100*medium_count/len(cloud.all_points):.3f}%)")
+        print(f"  Large fragments (> 11 cm):  {large_count:,} ({100*large_count/len(cloud.all_points):.3f}%)")
+    
+        # Monte Carlo impact probability calculation
+        print(f"\n" + "#"*60)
+        print("MONTE CARLO IMPACT PROBABILITY CALCULATION")
+        print("#"*60)
+    
+        # Standard Monte Carlo
+        print(f"\n1. Standard Monte Carlo Estimation:")
+        with instrumentation.span("main.standard_mc"):
+            result_standard = monte_carlo_impact_probability(cloud, hit_distance, num_trials=10000, use_sampling=True, sample_fraction=0.05, attribute_by="size_class")
+    
+        print(f"\nResults:")
+        print(f"  Impact Probability: {result_standard['probability']:.6f}")
+        print(f"  Hits: {result_standard['hits']:,} out of {result_standard['trials']:,} trials")
+        print(f"  Fragments Used: {result_standard['fragments_used']:,} ({100*result_standard['fragments_used']/len(cloud.all_points):.1f}% of total)")
+        print(f"  95% Confidence Interval: [{result_standard['confidence_interval'][0]:.6f}, {result_standard['confidence_interval'][1]:.6f}]")
+        print(f"  Standard Error: {result_standard['standard_error']:.6f}")
+        print(f"  Computation Time: {result_standard['computation_time']:.2f} seconds")
+        print(f"  By size class:")
+        for category, class_result in result_standard['attribution'].items():
+            print(f"    {category:<6}  P = {class_result['probability']:.6f}  95% CI [{class_result['confidence_interval'][0]:.6f}, {class_result['confidence_interval'][1]:.6f}]")
+    
+        # Adaptive Monte Carlo
+        print(f"\n2. Adaptive Monte Carlo with Sequential Refinement:")
+        with instrumentation.span("main.adaptive_mc"):
+            result_adaptive = adaptive_monte_carlo(cloud, hit_distance, target_precision=0.05)
+    
+        print(f"\nAdaptive Results:")
+        print(f"  Impact Probability: {result_adaptive['probability']:.6f}")
+        print(f"  Hits: {result_adaptive['hits']:,} out of {result_adaptive['trials']:,} trials")
+        print(f"  95% Confidence Interval: [{result_adaptive['confidence_interval'][0]:.6f}, {result_adaptive['confidence_interval'][1]:.6f}]")
+        print(f"  Total Computation Time: {result_adaptive['computation_time']:.2f} seconds")
+    
+        # Compare different hit distances
+        print(f"\n3. Sensitivity Analysis - Different Hit Distances:")    
+        with instrumentation.span("main.sensitivity", hit_distances=list(hit_distances)):
+            sweep = monte_carlo_sensitivity(cloud, hit_distances, num_trials=5000)
+        for hd, result in sweep.items():
+            print(f"  Hit distance {hd:3.1f} m: P = {result['probability']:.6f} ± {result['standard_error']:.6f}")
+    
+        print(f"\n" + "#"*60)
+        print("ANALYSIS COMPLETE")
+        print("#"*60)
+    finally:
+        if trace_sink is not None:
+            instrumentation.disable()
+            trace_sink.close()
 
 if __name__ == "__main__":
     main(parent_mass=10000, parent_radius=1000)  # large asteroid
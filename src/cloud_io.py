@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+
+__author__ = "Kamyar Modjtahedzadeh"
+__date__ = "October 18, 2026"
+
+"""
+    On-disk cloud format.
+
+    A saved cloud is a directory holding one raw ``.npy`` file per FragmentTable column and a
+    small ``cloud.json`` header (construction parameters, seed, cloud radius and the bin layout:
+    every SubCloud's 𝐿c, radius, 𝑛Frag and its inside/outside row ranges).  Loading maps the
+    columns with ``np.memmap`` (via ``np.load(mmap_mode="r")``), so even multi-GB clouds open
+    instantly and are only paged in as the hit-counting code touches them.
+
+    CloudCache keeps such directories keyed by construction parameters and seed.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+try:
+    # When imported as a module from parent directory
+    from src.gdmpidc import *
+except ImportError:
+    # When run directly from src directory
+    from gdmpidc import *
+
+FORMAT_VERSION = 2
+HEADER_FILE = "cloud.json"
+
+
+def save_cloud(cloud: Cloud, path: str) -> str:
+    """
+        Write a Cloud to the directory ``path`` (created if missing).
+
+        Returns:
+            str: path
+    """
+    os.makedirs(path, exist_ok=True)
+    for name in FragmentTable.columns:
+        np.save(os.path.join(path, f"{name}.npy"), np.ascontiguousarray(getattr(cloud.fragments, name)))
+
+    # Row ranges follow the layout built by Cloud: inside blocks first, then outside blocks
+    bins = []
+    inside_start, outside_start = 0, cloud.nInside
+    for category in cloud.subclouds:
+        for Lc, sub_cloud in cloud.subclouds[category].items():
+            n_in, n_out = len(sub_cloud.fragments), len(sub_cloud.outside_fragments)
+            bins.append({"category": category, "Lc": Lc, "nFrag": sub_cloud.nFrag, "radius": sub_cloud.radius,
+                         "inside": [inside_start, inside_start + n_in], "outside": [outside_start, outside_start + n_out]})
+            inside_start += n_in
+            outside_start += n_out
+
+    header = {
+        "format_version": FORMAT_VERSION,
+        "parent_mass": cloud.parent_mass,
+        "parent_radius": cloud.parent_radius,
+        "breakup_type": cloud.breakup_type,
+        "min_size": cloud.min_size,
+        "max_size": cloud.max_size,
+        "res": list(cloud.res) if cloud.res is not None else None,
+        "seed": cloud.seed,
+        "radius": cloud.radius,
+        "nFragments": len(cloud.fragments),
+        "nInside": cloud.nInside,
+        "bins": bins,
+    }
+    with open(os.path.join(path, HEADER_FILE), "w") as file:
+        json.dump(header, file, indent=1)
+    return path
+
+
+def load_cloud(path: str, mmap: bool = True) -> Cloud:
+    """
+        Open a cloud written by save_cloud without resampling it.
+
+        Args:
+            path (str): cloud directory
+            mmap (bool): memory-map the columns read-only (False reads them into RAM)
+
+        Returns:
+            Cloud: with fragments, all_points and every SubCloud's fragment views backed by the files
+    """
+    with open(os.path.join(path, HEADER_FILE)) as file:
+        header = json.load(file)
+    if header["format_version"] != FORMAT_VERSION:
+        raise ValueError(f"Unsupported cloud format version {header['format_version']} in {path}")
+
+    mmap_mode = "r" if mmap else None
+    fragments = FragmentTable(*(np.load(os.path.join(path, f"{name}.npy"), mmap_mode=mmap_mode) for name in FragmentTable.columns))
+
+    cloud = Cloud.__new__(Cloud)
+    cloud.parent_mass = header["parent_mass"]
+    cloud.parent_radius = header["parent_radius"]
+    cloud.breakup_type = header["breakup_type"]
+    cloud.min_size, cloud.max_size = header["min_size"], header["max_size"]
+    cloud.res = tuple(header["res"]) if header["res"] is not None else None
+    cloud.seed = header["seed"]
+    cloud.radius = header["radius"]
+    cloud.fragments = fragments
+    cloud.nInside = header["nInside"]
+    cloud.all_points = fragments.pos[:cloud.nInside]
+
+    cloud.subclouds = {"small": dict(), "medium": dict(), "large": dict()}
+    for entry in header["bins"]:
+        sub_cloud = SubCloud(entry["Lc"], cloud.parent_radius, entry["nFrag"], cloud.breakup_type, initialize=False)
+        sub_cloud.fragments = fragments[slice(*entry["inside"])]
+        sub_cloud.outside_fragments = fragments[slice(*entry["outside"])]
+        cloud.subclouds[entry["category"]][entry["Lc"]] = sub_cloud
+    return cloud
+
+
+class CloudCache:
+    """
+        Content-addressed on-disk cache of saved clouds.
+
+        An entry is the save_cloud directory of one Cloud, named by the SHA-256 of its
+        constructor arguments, seed and MODEL_VERSION.  Entries are written to a temporary
+        directory and renamed into place, so concurrent runs never see partial clouds (the
+        first finished writer wins).  Every hit refreshes the entry's timestamp, and after each
+        insertion least-recently-used entries are evicted until the cache fits in max_bytes.
+    """
+
+    def __init__(self, root: str = None, max_bytes: int = 20*2**30) -> None:
+        self.root = root or os.environ.get("DEBRIS_CLOUD_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "debris-cloud"))
+        self.max_bytes = max_bytes
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def key(par_mass: float, par_rad: float, breakup_type: str = "collision", min_size: float = 0.001, max_size: float = 1.0, res: tuple = (0.0001, 0.0005, 0.001), seed: int = None) -> str:
+        """Hex digest identifying a Cloud construction."""
+        description = json.dumps({"par_mass": float(par_mass), "par_rad": float(par_rad), "breakup_type": breakup_type,
+                                  "min_size": float(min_size), "max_size": float(max_size), "res": [float(r) for r in res] if res is not None else None,
+                                  "seed": seed, "model_version": MODEL_VERSION}, sort_keys=True)
+        return hashlib.sha256(description.encode()).hexdigest()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def get(self, key: str, mmap: bool = True):
+        """Cached Cloud for key, or None."""
+        path = self.path(key)
+        try:
+            cloud = load_cloud(path, mmap=mmap)
+        except (FileNotFoundError, ValueError):
+            return None
+        os.utime(os.path.join(path, HEADER_FILE))  # LRU timestamp
+        return cloud
+
+    def put(self, key: str, cloud: Cloud) -> str:
+        """Atomically store cloud under key, then evict down to max_bytes."""
+        path = self.path(key)
+        if not os.path.exists(path):
+            staging = tempfile.mkdtemp(prefix=".staging-", dir=self.root)
+            try:
+                save_cloud(cloud, staging)
+            except BaseException:
+                shutil.rmtree(staging, ignore_errors=True)
+                raise
+            try:
+                os.rename(staging, path)
+            except OSError:
+                shutil.rmtree(staging, ignore_errors=True)
+                if not os.path.exists(path):
+                    raise
+                # Another process stored the same cloud first
+        self.evict(keep=key)
+        return path
+
+    def cloud(self, par_mass: float, par_rad: float, breakup_type: str = "collision", min_size: float = 0.001, max_size: float = 1.0, res: tuple = (0.0001, 0.0005, 0.001), seed: int = None, mmap: bool = True) -> Cloud:
+        """
+            Cloud(par_mass, par_rad, ...) from the cache, building and storing it on a miss.
+
+            Unseeded clouds (seed=None) are random by construction and are never cached.
+        """
+        if seed is None:
+            return Cloud(par_mass, par_rad, breakup_type, min_size, max_size, res)
+        key = self.key(par_mass, par_rad, breakup_type, min_size, max_size, res, seed)
+        cloud = self.get(key, mmap=mmap)
+        if cloud is None:
+            built = Cloud(par_mass, par_rad, breakup_type, min_size, max_size, res, seed=seed)
+            self.put(key, built)
+            # Another process may evict the entry before it is reopened; the built cloud is just as good
+            cloud = self.get(key, mmap=mmap)
+            if cloud is None:
+                cloud = built
+        return cloud
+
+    def entries(self) -> list:
+        """(last used, bytes, key) of every complete entry, oldest first."""
+        entries = []
+        for key in os.listdir(self.root):
+            path = self.path(key)
+            try:
+                last_used = os.path.getmtime(os.path.join(path, HEADER_FILE))
+                size = sum(entry.stat().st_size for entry in os.scandir(path))
+            except (FileNotFoundError, NotADirectoryError):
+                continue  # staging directories and entries being evicted
+            entries.append((last_used, size, key))
+        return sorted(entries)
+
+    def evict(self, keep: str = None) -> None:
+        """Remove least-recently-used entries until the cache fits in max_bytes."""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, key in entries:
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            # Rename first so readers never open a half-deleted entry
+            trash = tempfile.mkdtemp(prefix=".evicted-", dir=self.root)
+            try:
+                os.rename(self.path(key), os.path.join(trash, key))
+            except OSError:
+                pass  # already evicted by another process
+            shutil.rmtree(trash, ignore_errors=True)
+            total -= size
@@ -10,9 +10,11 @@ __date__ = "May 1, 2025 - May 14, 2025"
 try:
     # When imported as a module from parent directory
     from src.gdmpidc_tools import *
+    from src import instrumentation
 except ImportError:
     # When run directly from src directory
     from gdmpidc_tools import *
+    import instrumentation
 import numpy as np
 
 # M_EARTH = 5.972e+24       # [kg]
@@ -20,121 +22,618 @@ import numpy as np
 parent_vel = 0              # [m·s^-1]
 
 
-class Fragment:
-    """PID fragments."""
+SIZE_CLASSES = ("small", "medium", "large")  # size-class ids 0, 1, 2 of the fragment table
+MODEL_VERSION = 7                            # bump whenever sampled clouds change for the same seed (invalidates cached clouds)
+SEED_BLOCK = 2**16                           # rows drawn per Generator in seeded sampling (see seeded_blocks)
+
+
+def size_class_id(Lc):
+    """Size-class id (0 small, 1 medium, 2 large) of one or many characteristic lengths."""
+    Lc = np.asarray(Lc)
+    return np.where(Lc < 0.08, 0, np.where(Lc <= 0.11, 1, 2)).astype(np.int8)
+
+
+class FragmentTable:
+    """
+        PID fragments stored column-wise (struct of arrays).
+
+        Every attribute is one contiguous NumPy column of length 𝑁; slicing with a
+        ``slice`` returns a table whose columns are views into the same buffers, so
+        sub-tables (per SubCloud, inside-radius blocks, ...) never copy fragment data.
+
+        Columns:
+            pos (𝑁,3) float64: (𝑥, 𝑦, 𝑧) positions [m]
+            r (𝑁,) float64: radial distance √(𝑥² + 𝑦² + 𝑧²) [m]
+            Lc (𝑁,) float64: characteristic length [m]
+            mass (𝑁,) float64: fragment mass [kg]
+            area (𝑁,) float64: cross-sectional area [m²]
+            vel (𝑁,) float64: ejection (expansion) velocity [m·s^-1]
+            size_class (𝑁,) int8: index into SIZE_CLASSES
+            inside (𝑁,) bool: fragment lies within its SubCloud radius
+            quantile (𝑁,) float64: the fragment's fixed radial quantile 𝑞 ∈ (0, 1)
+            direction (𝑁,3) float64: the fragment's fixed unit direction from the origin
+            bin_id (𝑁,) int32: index of the fragment's 𝐿c bin in size_bins order (-1 without bins)
+
+        quantile and direction are the common random numbers behind pos: positions at any
+        later time are a radial re-mapping of them (see SubCloud.radial_distance).
+    """
+
+    columns = ("pos", "r", "Lc", "mass", "area", "vel", "size_class", "inside", "quantile", "direction", "bin_id")
+
+    def __init__(self, pos, r, Lc, mass, area, vel, size_class, inside, quantile, direction, bin_id) -> None:
+        self.pos = pos
+        self.r = r
+        self.Lc = Lc
+        self.mass = mass
+        self.area = area
+        self.vel = vel
+        self.size_class = size_class
+        self.inside = inside
+        self.quantile = quantile
+        self.direction = direction
+        self.bin_id = bin_id
+
+    def __len__(self) -> int:
+        return len(self.r)
+
+    def __getitem__(self, key) -> "FragmentTable":
+        """Row selection; slices give zero-copy views, index arrays and masks give copies."""
+        return FragmentTable(*(getattr(self, name)[key] for name in self.columns))
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.pos[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.pos[:, 1]
+
+    @property
+    def z(self) -> np.ndarray:
+        return self.pos[:, 2]
+
+    # Bytes per fragment row across all columns
+    row_nbytes = 3*8 + 5*8 + 1 + 1 + 8 + 3*8 + 4
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes referenced by the columns (shared buffers are counted once per view)."""
+        return sum(getattr(self, name).nbytes for name in self.columns)
+
+    @classmethod
+    def empty(cls) -> "FragmentTable":
+        return cls(np.empty((0, 3)), np.empty(0), np.empty(0), np.empty(0), np.empty(0), np.empty(0),
+                   np.empty(0, dtype=np.int8), np.empty(0, dtype=bool), np.empty(0), np.empty((0, 3)), np.empty(0, dtype=np.int32))
+
+    @classmethod
+    def concatenate(cls, tables: list) -> "FragmentTable":
+        """Stack tables row-wise into one freshly allocated table."""
+        if not tables:
+            return cls.empty()
+        return cls(*(np.concatenate([getattr(t, name) for t in tables]) for name in cls.columns))
+
+    @classmethod
+    def from_positions(cls, characteristic_length, pos: np.ndarray, radius, creation_type: str = "collision", quantile: np.ndarray = None, direction: np.ndarray = None, bin_id: int = -1, rng=None) -> "FragmentTable":
+        """
+            Build the table of fragments of one characteristic length sampled at ``pos``.
+
+            characteristic_length and radius may also be per-fragment arrays (continuous sizes).
+            quantile and direction are the draws pos was generated from (sample_quantiles);
+            when omitted the direction is recovered from pos and the quantile is left as NaN.
+            rng (np.random.Generator) draws the A/M values; default is the global np.random state.
+        """
+        n = len(pos)
+        pos = np.ascontiguousarray(pos, dtype=np.float64).reshape(n, 3)
+        r = np.sqrt(np.einsum("ij,ij->i", pos, pos))  # r = √(x^2 + y^2 + z^2)
+        if direction is None:
+            direction = np.divide(pos, r[:, np.newaxis], out=np.tile([0.0, 0.0, 1.0], (n, 1)), where=r[:, np.newaxis] > 0)
+        if quantile is None:
+            quantile = np.full(n, np.nan)
+
+        # One A/M draw per fragment sets both its mass and its ejection velocity
+        if np.ndim(characteristic_length) == 0:
+            # One size bin: the per-size quantities are scalars filled into the columns
+            Lc = np.full(n, characteristic_length, dtype=np.float64)
+            AM = get_AM_values(np.log10(characteristic_length), size=n, rng=rng)
+            area = np.full(n, cross_sectional_area(characteristic_length))
+            mass = area / AM  # calculate_masses without rebroadcasting the scalar area
+            size_class = np.full(n, size_class_id(characteristic_length), dtype=np.int8)
+        else:
+            Lc = np.asarray(characteristic_length, dtype=np.float64)
+            AM = get_AM_values(np.log10(Lc), size=n, rng=rng)
+            area = cross_sectional_areas(Lc)
+            mass = calculate_masses(Lc, size=n, AM_ratio=AM)
+            size_class = size_class_id(Lc)
+        vel = parent_vel + ejection_velocity(AM, creation_type)
+
+        return cls(pos, r, Lc, mass, area, vel, size_class, r <= radius,
+                   np.asarray(quantile, dtype=np.float64), np.asarray(direction, dtype=np.float64), np.full(n, bin_id, dtype=np.int32))
+
+    def partition_inside(self) -> tuple:
+        """
+            Reorder rows so fragments inside their SubCloud radius come first.
 
-    def __init__(self, characteristic_length: float, pos: list, creation_type: str = "collision") -> None:
-        self.size = characteristic_length                         # characteristic length
-        self.pos = pos                                            # (x, y, z)
-        self.radial = np.sqrt(pos[0]**2 + pos[1]**2 + pos[2]**2)  # r = √(x^2 + y^2 + z^2)
+            Returns:
+                tuple: (table, 𝑘) where table[:𝑘] are the inside fragments
+        """
+        order = np.argsort(~self.inside, kind="stable")
+        return self[order], int(np.count_nonzero(self.inside))
 
-        self.mass = calculate_mass(characteristic_length)
-        self.area = cross_sectional_area(characteristic_length)
 
-        if creation_type == "collision":
-            ejection_vel = 0.9*np.log10(get_AM_value(np.log10(characteristic_length))) + 2.9
-        elif creation_type == "explosion":
-            ejection_vel = 0.2*np.log10(get_AM_value(np.log10(characteristic_length))) + 1.85
-        self.vel = parent_vel + ejection_vel
+class CompactPositions:
+    """
+        Reduced-precision copy of fragment positions for bandwidth-bound distance sweeps.
+
+        precision "float32" halves and "int16" quarters the 24 bytes per position.  int16
+        coordinates are quantized per group (run of equal ``groups`` labels, e.g. bin_id): each
+        group stores its bounding-box center and a step of half its extent/32767, so small, tight
+        bins keep a fine step.  decode() returns float32 positions together with a bound on their
+        coordinate error, and kernels refine borderline results against the full-precision
+        positions exact[rows].
+
+        Args:
+            exact (np.ndarray): (𝑁,3) float64 positions (may be a memmap)
+            precision (str): "float32" or "int16"
+            rows (np.ndarray): rows of exact to keep (default: all)
+            groups (np.ndarray): per-kept-row quantization group labels (default: one group)
+    """
+
+    precisions = ("float32", "int16")
+
+    def __init__(self, exact: np.ndarray, precision: str = "float32", rows: np.ndarray = None, groups: np.ndarray = None) -> None:
+        if precision not in self.precisions:
+            raise ValueError(f"Unknown precision {precision!r}; expected one of {self.precisions}")
+        self.exact, self.rows, self.precision = exact, rows, precision
+        points = np.asarray(exact if rows is None else exact[rows], dtype=np.float64)
+        n = len(points)
+        self.max_norm = float(np.sqrt(np.einsum("ij,ij->i", points, points).max())) if n else 0.0
+        if precision == "float32":
+            self.values = points.astype(np.float32)
+            return
+
+        # Group boundaries: runs of equal labels
+        groups = np.zeros(n, dtype=np.int64) if groups is None else np.asarray(groups)
+        self.starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if n else np.zeros(0, dtype=np.intp)
+        ends = np.r_[self.starts[1:], n].astype(np.intp)
+        low = np.minimum.reduceat(points, self.starts) if n else np.zeros((0, 3))
+        high = np.maximum.reduceat(points, self.starts) if n else np.zeros((0, 3))
+        self.center = 0.5*(low + high)
+        self.step = np.maximum((0.5*(high - low)).max(axis=1), np.finfo(np.float32).tiny) / 32767
+        group_of = np.repeat(np.arange(len(self.starts)), ends - self.starts)
+        self.values = np.round((points - self.center[group_of]) / self.step[group_of, np.newaxis]).astype(np.int16)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + (0 if self.precision == "float32" else self.center.nbytes + self.step.nbytes + self.starts.nbytes)
+
+    def decode(self, start: int, stop: int) -> tuple:
+        """
+            Rows [start, stop) as float32 positions.
+
+            Returns:
+                tuple: ((𝑛,3) float32 positions, bound on the distance between a decoded and exact position)
+        """
+        if self.precision == "float32":
+            chunk = self.values[start:stop]
+            return chunk, np.sqrt(3) * self.max_norm * 2.0**-24
+        stop = min(stop, len(self.values))
+        group_of = np.searchsorted(self.starts, np.arange(start, stop), side="right") - 1
+        step = self.step[group_of]
+        chunk = (self.values[start:stop] * step[:, np.newaxis] + self.center[group_of]).astype(np.float32)
+        # Half a step of quantization plus float32 rounding of the decoded value
+        return chunk, np.sqrt(3) * (0.5*step.max(initial=0.0) + self.max_norm * 2.0**-24)
+
+    def exact_rows(self, index: np.ndarray) -> np.ndarray:
+        """Full-precision positions of compact rows ``index``."""
+        return np.asarray(self.exact[index if self.rows is None else self.rows[index]], dtype=np.float64)
+
+
+def size_bins(par_mass: float, min_size: float = 0.001, max_size: float = 1.0, res: tuple = (0.0001, 0.0005, 0.001)):
+    """
+        Characteristic-length bins of a Cloud, in construction order.
+
+        Each bin holds point_count(𝐿c) fragments, truncated to an integer; the continuous mode
+        (Cloud with res=None) draws sizes without bins instead.
+
+        Yields:
+            tuple: (category, 𝐿c, number of fragments)
+    """
+    ΔLc_small, ΔLc_med, ΔLc_large = res
+
+    Lc = min_size
+    while Lc < 0.08:
+        yield "small", Lc, point_count(Lc, par_mass)
+        Lc += ΔLc_small
+    while 0.08 <= Lc <= 0.11:
+        yield "medium", Lc, point_count(Lc, par_mass)
+        Lc += ΔLc_med
+    while 0.11 < Lc <= max_size:
+        yield "large", Lc, point_count(Lc, par_mass)
+        Lc += ΔLc_large
+
+
+def sample_quantiles(n: int, rng=None) -> tuple:
+    """
+    Draw the time-independent randomness of 𝑛 fragments: a radial quantile and a direction.
+
+    Args:
+        𝑛 (int): Number of fragments
+        rng (np.random.Generator): random stream; default is the global np.random state
+
+    Returns:
+        tuple: (𝑞 (𝑛,) uniform radial quantiles, (𝑛,3) unit direction vectors)
+    """
+
+    rng = np.random if rng is None else rng
+    q = rng.uniform(0, 1, n)
+
+    # Sample angular coordinates for isotropic distribution
+    θ = np.arccos(2 * rng.uniform(0, 1, n) - 1)  # Uniform in cos(θ)
+    ϕ = rng.uniform(0, 2 * np.pi, n)             # Uniform in ϕ
+
+    # Convert to Cartesian unit vectors
+    direction = np.empty((n, 3))
+    direction[:, 0] = np.sin(θ)*np.cos(ϕ)
+    direction[:, 1] = np.sin(θ)*np.sin(ϕ)
+    direction[:, 2] = np.cos(θ)
+
+    return q, direction
+
+
+def continuous_fragment_count(par_mass: float, breakup_type: str = "collision", min_size: float = 0.001, max_size: float = 1.0, rng=None) -> int:
+    """
+        Number of fragments of a continuous-size cloud: 𝑁(min_size) - 𝑁(max_size), rounded
+        stochastically (up with probability equal to the fractional part) so no fraction is lost
+        on average.
+    """
+    rng = np.random if rng is None else rng
+    expected = expected_fragment_count(par_mass, min_size, max_size, breakup_type)
+    return int(expected) + int(rng.uniform(0, 1) < expected - int(expected))
+
+
+def seeded_blocks(seed, n: int, rng=None):
+    """
+        Split 𝑛 seeded draws into blocks of at most SEED_BLOCK rows, each with its own Generator.
+
+        Block 0 draws from rng (default np.random.default_rng(seed)) and block 𝑐 ≥ 1 from
+        SeedSequence(seed, spawn_key=(𝑐,)), so seeded fragments are the same whether a bin is
+        sampled whole (Cloud) or in chunks (stream_cloud).
+
+        Yields:
+            tuple: (number of rows in the block, np.random.Generator)
+    """
+    for c, start in enumerate(range(0, n, SEED_BLOCK)):
+        if c == 0:
+            block_rng = np.random.default_rng(seed) if rng is None else rng
+        else:
+            block_rng = np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(c,)))
+        yield min(SEED_BLOCK, n - start), block_rng
+
+
+def sample_seeded(sample, seed, n: int, rng=None) -> FragmentTable:
+    """Table of 𝑛 fragments drawn by sample(rows, rng) over the seeded_blocks of seed."""
+    tables = [sample(m, block_rng) for m, block_rng in seeded_blocks(seed, n, rng)]
+    return tables[0] if len(tables) == 1 else FragmentTable.concatenate(tables)
+
+
+def sample_continuous_fragments(n: int, par_rad: float, breakup_type: str = "collision", min_size: float = 0.001, max_size: float = 1.0, rng=None) -> FragmentTable:
+    """
+        Sample 𝑛 fragments whose sizes are drawn from the power law by inverse CDF.
+
+        Every fragment gets the geometry of its own 𝐿c (SubCloud radius, μ, σ), evaluated with
+        size-class masks over the whole array, so the cost scales with 𝑛 rather than a number
+        of bins.  Rows are in sampling order; ``inside`` is relative to each fragment's own radius.
+    """
+    with instrumentation.span("cloud.sample_continuous", n=n):
+        Lc = sample_characteristic_lengths(n, min_size, max_size, rng)
+        q, direction = sample_quantiles(n, rng)
+        μ, _, σ0, α, _ = empirical_parameter_arrays(Lc)
+        σ = Lc**(-α) * σ0
+        Rc = par_rad*packing_densities(Lc)**(-1/3)
+        positions = (σ*Rc*shell_radius_quantiles(q, μ/σ))[:, np.newaxis]*direction
+        table = FragmentTable.from_positions(Lc, positions, Rc, creation_type=breakup_type, quantile=q, direction=direction, rng=rng)
+    instrumentation.count("fragments.generated", n)
+    return table
 
-        # Get empirical parameters
-        self.μ, self.ρ0, self.σ0, self.α, self.γ = empirical_parameters(self.size)
 
 class Cloud:
-    """Full cloud..."""
-
-    def __init__(self, par_mass: float, par_rad: float, breakup_type: str = "collision", min_size: float = 0.001, max_size: float = 1.0, res: tuple = (0.0001, 0.0005, 0.001)) -> None:
-        small_cloud, ΔLc_small = dict(), res[0]
-        med_cloud,   ΔLc_med   = dict(), res[1]
-        large_cloud, ΔLc_large = dict(), res[2]
-
-        Lc = min_size
-        while Lc < 0.08:
-            small_cloud[Lc] = SubCloud(Lc, par_rad, point_count(Lc, par_mass), breakup_type)
-            Lc += ΔLc_small
-        while 0.08 <= Lc <= 0.11:
-            med_cloud[Lc] = SubCloud(Lc, par_rad, point_count(Lc, par_mass), breakup_type)
-            Lc += ΔLc_med
-        while 0.11 < Lc <= max_size:
-            large_cloud[Lc] = SubCloud(Lc, par_rad, point_count(Lc, par_mass), breakup_type)
-            Lc += ΔLc_large
-
-        self.subclouds = {"small": small_cloud, "medium": med_cloud, "large": large_cloud}
-        self.radius = par_rad*packing_density(max_size)**(-1/3)
-
-        relavent_points = []
-        for category in self.subclouds:
-            for Lc, sub_cloud in self.subclouds[category].items():
-                # Use the already initialized fragment positions instead of resampling
-                fragment_positions = [frag.pos for frag in sub_cloud.fragments]
-                inside_points = [point for point in fragment_positions if np.linalg.norm(point) <= sub_cloud.radius]
-                relavent_points.extend(inside_points)
-        self.all_points = relavent_points
+    """
+        Full cloud...
+
+        By default fragments are grouped into SubClouds on the 𝐿c grid set by ``res`` (see
+        size_bins).  With res=None the sizes are instead drawn per fragment from the power law
+        (sample_continuous_fragments): subclouds stay empty, and cloud.fragments carries each
+        fragment's 𝐿c and size class.
+
+        With lazy=True nothing is sampled up front: the SubClouds hold only their parameters, so
+        radius, summary() and expected counts are instant.  A SubCloud's fragments are sampled on
+        first access of its fragments, and the cloud table on first access of fragments,
+        all_points or nInside (reusing bins already sampled).  With a seed, bin 𝑏 is always drawn
+        from its own np.random.default_rng([seed, 𝑏]) (in seeded_blocks of SEED_BLOCK rows), so
+        lazy and eager clouds and stream_cloud(seed=seed) hold the same fragments whatever the
+        access order, and the global np.random state is left untouched.
+    """
+
+    def __init__(self, par_mass: float, par_rad: float, breakup_type: str = "collision", min_size: float = 0.001, max_size: float = 1.0, res: tuple = (0.0001, 0.0005, 0.001), seed: int = None, lazy: bool = False) -> None:
+        self.parent_mass = par_mass
+        self.parent_radius = par_rad
+        self.breakup_type = breakup_type
+        self.min_size, self.max_size, self.res = min_size, max_size, tuple(res) if res is not None else None
+        self.seed = seed
+        self._fragments, self._nInside, self._all_points = None, None, None
+
+        with instrumentation.span("cloud.build", parent_mass=par_mass, parent_radius=par_rad):
+            self.subclouds = {"small": dict(), "medium": dict(), "large": dict()}
+            self.radius = par_rad*packing_density(max_size)**(-1/3)
+            if res is not None:
+                for b, (category, Lc, nFrag) in enumerate(size_bins(par_mass, min_size, max_size, res)):
+                    self.subclouds[category][Lc] = SubCloud(Lc, par_rad, nFrag, breakup_type, initialize=not lazy, lazy=lazy,
+                                                            seed=None if seed is None else (seed, b))
+            if not lazy:
+                self._materialize()
+
+    def _materialize(self) -> None:
+        """Sample (or collect the already sampled bins of) the whole cloud into one fragment table."""
+        if self.res is None:
+            # Continuous sizes: one power-law draw per fragment, inside fragments first
+            rng = None if self.seed is None else np.random.default_rng(self.seed)
+            n = continuous_fragment_count(self.parent_mass, self.breakup_type, self.min_size, self.max_size, rng)
+            sample = lambda m, block_rng: sample_continuous_fragments(m, self.parent_radius, self.breakup_type, self.min_size, self.max_size, block_rng)
+            table = sample(n, None) if self.seed is None else sample_seeded(sample, self.seed, n, rng)
+            with instrumentation.span("cloud.inside_filter"):
+                self._fragments, self._nInside = table.partition_inside()
+            instrumentation.count("fragments.kept", self._nInside)
+        else:
+            # One fragment table for the whole cloud: every SubCloud's inside fragments first
+            # (in bin order), then every SubCloud's outside fragments.  SubCloud.fragments and
+            # Cloud.all_points are then slice views into it rather than copies.
+            sub_clouds = [sub_cloud for category in self.subclouds for sub_cloud in self.subclouds[category].values()]
+            bins = [(sc.fragments, sc.outside_fragments) for sc in sub_clouds]
+            with instrumentation.span("cloud.inside_filter"):
+                self._fragments = FragmentTable.concatenate([inside for inside, _ in bins] + [outside for _, outside in bins])
+                self._nInside = sum(len(inside) for inside, _ in bins)
+
+                inside_start, outside_start = 0, self._nInside
+                for b, (sc, (inside, outside)) in enumerate(zip(sub_clouds, bins)):
+                    n_in, n_out = len(inside), len(outside)
+                    sc.fragments = self._fragments[inside_start:inside_start + n_in]
+                    sc.outside_fragments = self._fragments[outside_start:outside_start + n_out]
+                    sc.fragments.bin_id[:] = sc.outside_fragments.bin_id[:] = b
+                    inside_start += n_in
+                    outside_start += n_out
+        instrumentation.count("bytes.allocated", self._fragments.nbytes)
+
+        self._all_points = self._fragments.pos[:self._nInside]  # (𝑁,3) view of the relevant (inside) points
+
+    @property
+    def fragments(self) -> FragmentTable:
+        if self._fragments is None:
+            self._materialize()
+        return self._fragments
+
+    @fragments.setter
+    def fragments(self, table: FragmentTable) -> None:
+        self._fragments = table
+
+    @property
+    def nInside(self) -> int:
+        if self._fragments is None:
+            self._materialize()
+        return self._nInside
+
+    @nInside.setter
+    def nInside(self, n: int) -> None:
+        self._nInside = n
+
+    @property
+    def all_points(self) -> np.ndarray:
+        if self._fragments is None:
+            self._materialize()
+        return self._all_points
+
+    @all_points.setter
+    def all_points(self, points: np.ndarray) -> None:
+        self._all_points = points
+
+    @property
+    def is_materialized(self) -> bool:
+        return self._fragments is not None
+
+    def summary(self) -> dict:
+        """
+            Per-category totals from the bin parameters alone, without sampling any fragment.
+
+            Returns:
+                dict: category -> {"fragments": Σ nFrag, "expected_inside": Σ nFrag·P(𝑟 ≤ radius)}
+        """
+        if self.res is None:
+            raise ValueError("summary() needs a binned Cloud (res=None clouds have no SubClouds)")
+        return {category: {"fragments": sum(sc.nFrag for sc in self.subclouds[category].values()),
+                           "expected_inside": sum(sc.nFrag*sc.inside_fraction() for sc in self.subclouds[category].values())}
+                for category in self.subclouds}
+
+    @property
+    def bin_lengths(self) -> np.ndarray:
+        """𝐿c of every bin, indexed by the fragments' bin_id (empty for continuous-size clouds)."""
+        return np.array([Lc for category in self.subclouds for Lc in self.subclouds[category]], dtype=np.float64)
+
+    def positions_at(self, t: float, rows=None, out: np.ndarray = None) -> np.ndarray:
+        """
+            Fragment positions at time 𝑡, in the row order of self.fragments.
+
+            Every fragment keeps its quantile and direction, so this is the radial re-mapping
+            𝑟(𝑡) = σ(𝑡)𝑅c(𝑡)·𝐹⁻¹(𝑞; μ/σ(𝑡)) of SubCloud.radial_distance evaluated for all bins at
+            once (bin by bin through the per-𝑘 tables; per row only for continuous sizes); at
+            𝑡 = 0 it reproduces self.fragments.pos.
+
+            Args:
+                𝑡 (float): Time since impact [s]
+                rows: row selection of self.fragments (default: all; slice(0, nInside) matches all_points)
+                out (np.ndarray, optional): (𝑛,3) buffer to write into
+
+            Returns:
+                np.ndarray: (𝑛,3) positions [m]
+        """
+        table = self.fragments if rows is None else self.fragments[rows]
+        μ, _, σ0, α, γ = empirical_parameter_arrays(table.Lc)
+        σ = table.Lc**(-α) * (σ0 + γ*t)
+        Rc = self.parent_radius*packing_densities(table.Lc)**(-1/3) + t*expansion_velocity(parent_mass=1000, L_min=0.001, L_max=15.0, breakup_type=self.breakup_type)
+        k = μ/σ
+        if self.res is None:
+            y = shell_radius_quantiles(table.quantile, k)
+        else:
+            # Binned: each run of one bin's rows goes through that bin's ShellRadiusTable
+            starts = np.flatnonzero(np.diff(table.bin_id, prepend=-2))
+            y = np.empty(len(table))
+            for start, stop in zip(starts, np.r_[starts[1:], len(table)]):
+                y[start:stop] = shell_radius_quantiles(table.quantile[start:stop], k[start])
+        r = σ*Rc*y
+        return np.multiply(r[:, np.newaxis], table.direction, out=out)
+
+    def timeline(self, times, rows=None, reuse_buffer: bool = False):
+        """
+            Position snapshots of the same fragments at each time in ``times``.
+
+            Row 𝑖 of every frame is the same fragment (row 𝑖 of self.fragments[rows]), so hit
+            statistics at different times are directly comparable.  SubCloud views are slices of
+            these rows; SubCloud.positions_at gives a single bin.
+
+            Args:
+                times (iterable): times since impact [s]
+                reuse_buffer (bool): write every frame into one array (copy a frame to keep it)
+
+            Yields:
+                tuple: (𝑡, (𝑛,3) positions)
+        """
+        buffer = None
+        for t in times:
+            frame = self.positions_at(t, rows, out=buffer)
+            if reuse_buffer:
+                buffer = frame
+            yield t, frame
 
 
 class SubCloud:
     """Each specific characteristic length forms it's own relative (sub) cloud."""
 
-    def __init__(self, characteristic_length, parent_rad, num_fragments, breakup_type: str = "collision") -> None:
+    def __init__(self, characteristic_length, parent_rad, num_fragments, breakup_type: str = "collision", initialize: bool = True, lazy: bool = False, seed=None) -> None:
+        """
+            initialize samples the fragments now; lazy=True instead samples them on first access of
+            fragments/outside_fragments.  With a seed (anything np.random.default_rng takes) the
+            fragments are drawn from their own Generator instead of the global np.random state.
+        """
         self.nFrag = num_fragments
         self.fragSize = characteristic_length
         self.breakup_type = breakup_type
+        self.lazy, self.seed = lazy, seed
 
         self.radius = parent_rad * packing_density(characteristic_length)**(-1/3)  # Eqn. (1.1) of gdmpidc.md
-        self.fragments = self._initialize_fragments()                              # initialize fragments with sampled positions
+        self._fragments, self._outside_fragments = None, None
+        if initialize:
+            self._fragments, self._outside_fragments = self._initialize_fragments()  # fragments inside / outside self.radius
+
+    @property
+    def fragments(self) -> FragmentTable:
+        if self._fragments is None and self.lazy:
+            self._fragments, self._outside_fragments = self._initialize_fragments()
+        return self._fragments
+
+    @fragments.setter
+    def fragments(self, table: FragmentTable) -> None:
+        self._fragments = table
+
+    @property
+    def outside_fragments(self) -> FragmentTable:
+        if self._fragments is None and self.lazy:
+            self._fragments, self._outside_fragments = self._initialize_fragments()
+        return self._outside_fragments
+
+    @outside_fragments.setter
+    def outside_fragments(self, table: FragmentTable) -> None:
+        self._outside_fragments = table
+
+    def inside_fraction(self, t: float = 0) -> float:
+        """
+            Expected fraction of fragments within the radius at time 𝑡, P(𝑟 ≤ R_c(𝑡)).
 
-    def _initialize_fragments(self) -> list:
-        """Initialize nFrag fragments with positions sampled from the cloud's density distribution."""
-        positions = self.sample_positions(self.nFrag)
-        return [Fragment(self.fragSize, pos, creation_type=self.breakup_type) for pos in positions]
+            In units of σR_c the radius is 1/σ, so this is shell_cdf(1/σ, μ/σ)/shell_norm(μ/σ).
+        """
+        μ, _, _, _, _ = empirical_parameters(self.fragSize)
+        σ = self.spatial_dispersion(t)
+        return float(shell_cdf(1/σ, μ/σ) / shell_norm(μ/σ))
 
-    def sample_positions(self, n: int = None) -> list:
+    def _initialize_fragments(self) -> tuple:
         """
-        Sample 𝑛 positions from the cloud's Gaussian density distribution.
+            Initialize nFrag fragments with positions sampled from the cloud's density distribution.
+
+            Returns:
+                tuple: (inside, outside) FragmentTable views of the fragments within and beyond self.radius
+        """
+        table = self.sample_fragments(self.nFrag) if self.seed is None else sample_seeded(self.sample_fragments, self.seed, self.nFrag)
+        with instrumentation.span("cloud.inside_filter"):
+            table, n_inside = table.partition_inside()
+        instrumentation.count("fragments.kept", n_inside)
+        return table[:n_inside], table[n_inside:]
+
+    def sample_fragments(self, n: int, rng=None) -> FragmentTable:
+        """Sample a fresh FragmentTable of 𝑛 fragments of this SubCloud (rows in sampling order) from rng (default: global state)."""
+        with instrumentation.span("cloud.sample_bin", Lc=self.fragSize, n=n):
+            q, direction = self.sample_quantiles(n, rng)
+            positions = self.radial_distance(q, t=0)[:, np.newaxis]*direction
+            table = FragmentTable.from_positions(self.fragSize, positions, self.radius, creation_type=self.breakup_type,
+                                                 quantile=q, direction=direction, rng=rng)
+        instrumentation.count("fragments.generated", n)
+        return table
+
+    def sample_quantiles(self, n: int = None, rng=None) -> tuple:
+        """Radial quantiles and unit directions of 𝑛 fragments (default: nFrag); see sample_quantiles."""
+        return sample_quantiles(self.nFrag if n is None else n, rng)
+
+    def radial_distance(self, q, t: float = 0) -> np.ndarray:
+        """
+        Radial distances at time 𝑡 of fragments with radial quantiles 𝑞.
+
+        The density is proportional to exp(-0.5 * ((r - μ*R)/(σ*R))^2)
+        In spherical coordinates, the radial probability includes a r^2 factor
+        We sample r from a distribution proportional to r^2 * exp(-0.5 * ((r - μ*R)/(σ*R))^2)
+
+        In units of σ*R this law depends only on 𝑘 = μ/σ, so 𝑞 is mapped through the exact inverse
+        CDF of 𝑦² exp(-½(𝑦 - 𝑘)²) (shell_radius_quantiles, tabulated once per 𝑘) and scaled by σ*R.
 
         Args:
-            𝑛 (int): Number of positions to sample
+            𝑞 (np.ndarray): radial quantiles in (0, 1)
+            𝑡 (float): Time since impact [s]
 
         Returns:
-            list: List of [𝑥, 𝑦, 𝑧] coordinates
+            np.ndarray: radial distances [m]
         """
 
-        if n is None:
-            n = self.nFrag
-
-        # Get empirical parameters for the Gaussian distribution
         μ, _, _, _, _ = empirical_parameters(self.fragSize)
-        # Use initial spatial dispersion (t=0)
-        σ = self.spatial_dispersion(t=0)  # σ = σ0 * L^(-α)
-        Rc = self.radius
-
-        # The density is proportional to exp(-0.5 * ((r - μ*R)/(σ*R))^2)
-        # In spherical coordinates, the radial probability includes a r^2 factor
-        # We sample r from a distribution proportional to r^2 * exp(-0.5 * ((r - μ*R)/(σ*R))^2)
+        σ = self.spatial_dispersion(t)  # σ = L^(-α) * (σ0 + γ*t)
+        Rc = self.updated_radius(t)
 
-        # Define the mean and standard deviation in radial distance
-        mean_r = μ*Rc
-        std_r = σ*Rc
+        return σ*Rc*shell_radius_quantiles(q, μ/σ)
 
-        # To sample from the non-standard distribution, use rejection sampling or approximate with a Gaussian
-        # For simplicity, we'll approximate by sampling from a Gaussian and adjust for spherical symmetry
-        # Note: This is an approximation; for high precision, implement rejection sampling
+    def sample_positions(self, n: int = None) -> np.ndarray:
+        """
+        Sample 𝑛 positions from the cloud's Gaussian density distribution.
 
-        # Sample radial distances (approximate Gaussian, clipped to avoid negative r)
-        𝒩 = np.random.normal(loc=mean_r, scale=std_r, size=n)
-        r = np.maximum(𝒩, 0)  # Ensure non-negative radial distances
+        Args:
+            𝑛 (int): Number of positions to sample
 
-        # Sample angular coordinates for isotropic distribution
-        θ = np.arccos(2 * np.random.uniform(0, 1, n) - 1)  # Uniform in cos(θ)
-        ϕ = np.random.uniform(0, 2 * np.pi, n)             # Uniform in ϕ
+        Returns:
+            np.ndarray: (𝑛,3) array of [𝑥, 𝑦, 𝑧] coordinates
+        """
 
-        # Convert to Cartesian coordinates
-        x = r*np.sin(θ)*np.cos(ϕ)
-        y = r*np.sin(θ)*np.sin(ϕ)
-        z = r*np.cos(θ)
+        q, direction = self.sample_quantiles(n)
+        return self.radial_distance(q, t=0)[:, np.newaxis]*direction
 
-        # Return list of [x, y, z] coordinates
-        return [[x[i], y[i], z[i]] for i in range(n)]
+    def positions_at(self, t: float) -> np.ndarray:
+        """(𝑛,3) positions at time 𝑡 of this SubCloud's fragments (same rows as self.fragments)."""
+        return self.radial_distance(self.fragments.quantile, t)[:, np.newaxis]*self.fragments.direction
 
     def updated_radius(self, t: float, inplace: bool = False) -> float:
         """
@@ -147,7 +646,7 @@ class SubCloud:
             Returns:
                 float: SubCloud radius at time 𝑡 [m]
         """
-        updated_radius = self.radius + t*expansion_velocity(parent_mass=1000, L_min=0.001, L_max=15.0)
+        updated_radius = self.radius + t*expansion_velocity(parent_mass=1000, L_min=0.001, L_max=15.0, breakup_type=self.breakup_type)
         if inplace:
             self.radius = updated_radius
         return updated_radius
@@ -166,6 +665,94 @@ class SubCloud:
         return self.fragSize**(-α) * (σ0 + γ*t)
 
 
+def stream_cloud(par_mass: float, par_rad: float, breakup_type: str = "collision", min_size: float = 0.001, max_size: float = 1.0, res: tuple = (0.0001, 0.0005, 0.001), max_bytes: int = 256*2**20, inside_only: bool = False, seed: int = None):
+    """
+        Generate the fragments of Cloud(par_mass, par_rad, ...) as a stream of bounded chunks.
+
+        Bins are visited in the same order as Cloud; a bin larger than the memory ceiling is
+        sampled in several chunks.  Only one chunk is alive at a time, so memory stays at about
+        max_bytes regardless of the parent mass.
+
+        Args:
+            max_bytes (int): memory ceiling per chunk [bytes]
+            inside_only (bool): drop fragments beyond their SubCloud radius (the Cloud.all_points set)
+            seed (int): draw every bin from the same seeded_blocks as Cloud(..., seed=seed), so the
+                stream holds the cloud's fragments (per bin in sampling rather than inside-first
+                order); chunks are then cut from blocks of SEED_BLOCK rows
+
+        With res=None the continuous-size fragments are streamed in chunks instead, with None
+        in place of the SubCloud.
+
+        Yields:
+            tuple: (SubCloud without materialized fragments, FragmentTable chunk of that bin)
+    """
+    chunk_size = max(int(max_bytes // FragmentTable.row_nbytes), 1)
+
+    def chunks(sample, n, seed, rng=None):
+        if seed is None:
+            blocks = ((min(chunk_size, n - start), None) for start in range(0, n, chunk_size))
+        else:
+            blocks = seeded_blocks(seed, n, rng)
+        for m, block_rng in blocks:
+            block = sample(m, block_rng)
+            for start in range(0, m, chunk_size):
+                chunk = block[start:start + chunk_size]
+                yield chunk[chunk.inside] if inside_only else chunk
+
+    if res is None:
+        rng = None if seed is None else np.random.default_rng(seed)
+        n = continuous_fragment_count(par_mass, breakup_type, min_size, max_size, rng)
+        sample = lambda m, block_rng: sample_continuous_fragments(m, par_rad, breakup_type, min_size, max_size, block_rng)
+        for chunk in chunks(sample, n, seed, rng):
+            yield None, chunk
+        return
+    for b, (category, Lc, nFrag) in enumerate(size_bins(par_mass, min_size, max_size, res)):
+        bin_seed = None if seed is None else (seed, b)
+        sub_cloud = SubCloud(Lc, par_rad, nFrag, breakup_type, initialize=False, seed=bin_seed)
+        for chunk in chunks(sub_cloud.sample_fragments, nFrag, bin_seed):
+            chunk.bin_id[:] = b
+            yield sub_cloud, chunk
+
+
+class InsideCounter:
+    """Stream reducer: sampled and inside-radius fragment counts per size class."""
+
+    def __init__(self) -> None:
+        self.total = np.zeros(len(SIZE_CLASSES), dtype=np.int64)
+        self.inside = np.zeros(len(SIZE_CLASSES), dtype=np.int64)
+
+    def update(self, sub_cloud, chunk: FragmentTable) -> None:
+        self.total += np.bincount(chunk.size_class, minlength=len(SIZE_CLASSES))
+        self.inside += np.bincount(chunk.size_class[chunk.inside], minlength=len(SIZE_CLASSES))
+
+    def result(self) -> dict:
+        return {category: {"total": int(self.total[k]), "inside": int(self.inside[k])} for k, category in enumerate(SIZE_CLASSES)}
+
+
+class RadialHistogram:
+    """Stream reducer: histogram of radial distances (optionally inside fragments only)."""
+
+    def __init__(self, bins, inside_only: bool = True) -> None:
+        self.edges = np.asarray(bins, dtype=float)
+        self.counts = np.zeros(len(self.edges) - 1, dtype=np.int64)
+        self.inside_only = inside_only
+
+    def update(self, sub_cloud, chunk: FragmentTable) -> None:
+        r = chunk.r[chunk.inside] if self.inside_only else chunk.r
+        self.counts += np.histogram(r, self.edges)[0]
+
+    def result(self) -> tuple:
+        return self.counts, self.edges
+
+
+def reduce_stream(stream, reducers: list) -> list:
+    """Feed every (SubCloud, chunk) of a stream_cloud stream to each reducer; return their results."""
+    for sub_cloud, chunk in stream:
+        for reducer in reducers:
+            reducer.update(sub_cloud, chunk)
+    return [reducer.result() for reducer in reducers]
+
+
 if __name__ == "__main__":
     #cloud = SubCloud(characteristic_length=0.05, num_fragments=1000, parent_rad=1000)
     #vec_r = init_positions = cloud.sample_positions()
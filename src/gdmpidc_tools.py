@@ -4,8 +4,11 @@ __author__ = "Claude 3.7 Sonnet, Kamyar Modjtahedzadeh, Claude 3.5 Sonnet V2"
 __date__ = "May 1, 2025 - June 2, 2025"
 
 import warnings     # Must be imported before scipy and numpy.
+from functools import lru_cache
+import numpy as np
 from numpy import log10, random
 from scipy import integrate
+from scipy.special import ndtr, ndtri
 
 warnings.filterwarnings("ignore", category=integrate.IntegrationWarning)
 
@@ -166,9 +169,268 @@ def calculate_mass(Lc, fragment_type="upper_stage"):
     return mass
 
 
+# Vectorized NASA Standard Breakup Model (array in / array out)
+def large_AM_parameters(log_Lc, fragment_type="upper_stage"):
+    """
+    Bimodal mixture parameters of the >11 cm A/M distribution, evaluated element-wise.
+    Same piecewise-linear branches as sample_large_AM_distribution.
+
+    Returns:
+        tuple: (alpha, mu1, sigma1, mu2, sigma2) arrays shaped like log_Lc
+    """
+    x = np.asarray(log_Lc, dtype=float)
+    if fragment_type == "upper_stage":
+        alpha = np.select([x <= -1.4, x < 0], [1.0, 1.0 - 0.3571 * (x + 1.4)], 0.5)
+        mu1 = np.select([x <= -0.5, x < 0], [-0.45, -0.45 - 0.9 * (x + 0.5)], -0.9)
+        sigma1 = np.full(x.shape, 0.55)
+        mu2 = np.full(x.shape, -0.9)
+        sigma2 = np.select([x <= -1.0, x < 0.1], [0.28, 0.28 - 0.1636 * (x + 1)], 0.1)
+    else:
+        alpha = np.select([x <= -1.95, x < 0.55], [0.0, 0.3 + 0.4 * (x + 1.2)], 1.0)
+        mu1 = np.select([x <= -1.1, x < 0], [-0.6, -0.6 - 0.318 * (x + 1.1)], -0.95)
+        sigma1 = np.select([x <= -1.3, x < -0.3], [0.1, 0.1 + 0.2 * (x + 1.3)], 0.3)
+        mu2 = np.select([x <= -0.7, x < -0.1], [-1.2, -1.2 - 1.333 * (x + 0.7)], -2.0)
+        sigma2 = np.select([x <= -0.5, x < -0.3], [0.5, 0.5 - (x + 0.5)], 0.3)
+    return alpha, mu1, sigma1, mu2, sigma2
+
+
+def small_AM_parameters(log_Lc):
+    """
+    Normal parameters of the <8 cm (SOC) A/M distribution, evaluated element-wise.
+
+    Returns:
+        tuple: (mu, sigma) arrays shaped like log_Lc
+    """
+    x = np.asarray(log_Lc, dtype=float)
+    mu = np.select([x <= -1.75, x < -1.25], [-0.3, -0.3 - 1.4 * (x + 1.75)], -1.0)
+    sigma = np.where(x <= -3.5, 0.2, 0.2 + 0.1333 * (x + 3.5))
+    return mu, sigma
+
+
+def sample_large_AM_values(log_Lc, fragment_type="upper_stage", rng=None):
+    """Draw one A/M value [m²/kg] per element of log_Lc from the >11 cm bimodal distribution."""
+    rng = random if rng is None else rng
+    alpha, mu1, sigma1, mu2, sigma2 = large_AM_parameters(log_Lc, fragment_type)
+    first = rng.random(alpha.shape) < alpha
+    log_AM = rng.normal(np.where(first, mu1, mu2), np.where(first, sigma1, sigma2))
+    return 10**log_AM
+
+
+def sample_small_AM_values(log_Lc, rng=None):
+    """Draw one A/M value [m²/kg] per element of log_Lc from the <8 cm distribution."""
+    rng = random if rng is None else rng
+    mu, sigma = small_AM_parameters(log_Lc)
+    return 10**rng.normal(mu, sigma)
+
+
+def get_AM_values(log_Lc, fragment_type="upper_stage", size=None, rng=None):
+    """
+    Vectorized get_AM_value: one A/M sample per element of log_Lc.
+
+    Args:
+        log_Lc: array (or scalar) of log10 characteristic lengths in meters
+        fragment_type: "upper_stage" or "spacecraft"
+        size: if given, broadcast log_Lc to this shape first (e.g. 𝑛 fragments of one size)
+        rng: np.random.Generator; defaults to the global np.random state
+
+    Returns:
+        np.ndarray: sampled A/M values in m²/kg
+    """
+    x = np.asarray(log_Lc, dtype=float)
+    if size is not None:
+        x = np.broadcast_to(x, size)
+
+    log_small, log_large = log10(0.08), log10(0.11)
+    large = x > log_large
+    small = x < log_small
+    transition = ~(large | small)
+
+    AM = np.empty(x.shape)
+    if large.any():
+        AM[large] = sample_large_AM_values(x[large], fragment_type, rng)
+    if small.any():
+        AM[small] = sample_small_AM_values(x[small], rng)
+    if transition.any():
+        # Linearly interpolate between small and large fragment distributions
+        xt = x[transition]
+        weight = (xt - log_small) / (log_large - log_small)
+        AM[transition] = sample_small_AM_values(xt, rng) * (1 - weight) + sample_large_AM_values(xt, fragment_type, rng) * weight
+    return AM
+
+
+def cross_sectional_areas(Lc):
+    """Vectorized cross_sectional_area."""
+    Lc = np.asarray(Lc, dtype=float)
+    return np.where(Lc < 0.00167, 0.540424 * Lc**2, 0.556945 * Lc**2.0047077)
+
+
+def calculate_masses(Lc, fragment_type="upper_stage", size=None, rng=None, AM_ratio=None):
+    """
+    Vectorized calculate_mass.
+
+    Args:
+        AM_ratio: previously sampled A/M values to reuse (e.g. the ones that also set the
+                  ejection velocity); sampled with get_AM_values when omitted
+
+    Returns:
+        np.ndarray: fragment masses in kg
+    """
+    Lc = np.asarray(Lc, dtype=float)
+    if size is not None:
+        Lc = np.broadcast_to(Lc, size)
+    if AM_ratio is None:
+        AM_ratio = get_AM_values(np.log10(Lc), fragment_type, rng=rng)
+    return cross_sectional_areas(Lc) / AM_ratio
+
+
+def ejection_velocity(AM_ratio, breakup_type="collision"):
+    """Ejection velocity [m/s] from the A/M ratio; Eqs. (2.4), (2.5) of gdmpidc.md. Works on arrays."""
+    if breakup_type == "explosion":
+        return 0.2 * np.log10(AM_ratio) + 1.85
+    else:  # collision
+        return 0.9 * np.log10(AM_ratio) + 2.9
+
+
+def _transition_expectation(x, g, fragment_type="upper_stage", n_nodes=24):
+    """
+    E[g(A/M)] in the 8-11 cm transition, where get_AM_value blends a small and a large A/M
+    *value* linearly; evaluated with a tensor Gauss-Hermite rule over the two normal log-laws.
+    """
+    log_small, log_large = log10(0.08), log10(0.11)
+    z, w = np.polynomial.hermite_e.hermegauss(n_nodes)  # nodes/weights for exp(-z²/2)
+    w = w / w.sum()
+    mu_s, sigma_s = small_AM_parameters(x)
+    alpha, mu1, sigma1, mu2, sigma2 = large_AM_parameters(x, fragment_type)
+
+    weight = ((x - log_small) / (log_large - log_small))[:, None, None]
+    small_AM = 10**(mu_s[:, None, None] + sigma_s[:, None, None]*z[:, None])
+
+    def blended(mu, sigma):
+        large_AM = 10**(mu[:, None, None] + sigma[:, None, None]*z[None, :])
+        return g(small_AM*(1 - weight) + large_AM*weight) @ w @ w
+
+    return alpha*blended(mu1, sigma1) + (1 - alpha)*blended(mu2, sigma2)
+
+
+def expected_log_AM(log_Lc, fragment_type="upper_stage", n_nodes=24):
+    """
+    Expected value of log10(A/M) under the distribution sampled by get_AM_value, element-wise.
+
+    Outside the 8-11 cm transition this is the (mixture) mean of the normal components; inside
+    it the blended A/M values are integrated by _transition_expectation.
+
+    Returns:
+        np.ndarray: E[log10(A/M)] shaped like log_Lc
+    """
+    x = np.asarray(log_Lc, dtype=float)
+    log_small, log_large = log10(0.08), log10(0.11)
+
+    mu_s, _ = small_AM_parameters(x)
+    alpha, mu1, _, mu2, _ = large_AM_parameters(x, fragment_type)
+    expected = np.where(x > log_large, alpha*mu1 + (1 - alpha)*mu2, mu_s)
+
+    transition = (x >= log_small) & (x <= log_large)
+    if transition.any():
+        expected[transition] = _transition_expectation(x[transition], np.log10, fragment_type, n_nodes)
+    return expected
+
+
+def expected_inverse_AM(log_Lc, fragment_type="upper_stage", n_nodes=24):
+    """
+    Expected value of M/A = 1/(A/M) [kg/m²], element-wise.
+
+    For log10(A/M) ~ 𝒩(𝑚, 𝑠²), E[10^(-log10 A/M)] = 10^(-𝑚)·exp((𝑠 ln10)²/2); mixtures are
+    weighted by alpha and the transition is integrated by _transition_expectation.
+    """
+    x = np.asarray(log_Lc, dtype=float)
+    log_small, log_large = log10(0.08), log10(0.11)
+    ln10 = np.log(10)
+
+    def lognormal_inverse_mean(mu, sigma):
+        return 10**(-mu) * np.exp(0.5*(sigma*ln10)**2)
+
+    mu_s, sigma_s = small_AM_parameters(x)
+    alpha, mu1, sigma1, mu2, sigma2 = large_AM_parameters(x, fragment_type)
+    expected = np.where(x > log_large,
+                        alpha*lognormal_inverse_mean(mu1, sigma1) + (1 - alpha)*lognormal_inverse_mean(mu2, sigma2),
+                        lognormal_inverse_mean(mu_s, sigma_s))
+
+    transition = (x >= log_small) & (x <= log_large)
+    if transition.any():
+        expected[transition] = _transition_expectation(x[transition], np.reciprocal, fragment_type, n_nodes)
+    return expected
+
+
+def expected_mass(Lc, fragment_type="upper_stage"):
+    """Mean fragment mass [kg] of calculate_mass at characteristic length 𝐿c, element-wise."""
+    return cross_sectional_areas(Lc) * expected_inverse_AM(np.log10(Lc), fragment_type)
+
+
+def expected_ejection_velocity(L_c, breakup_type="collision", fragment_type="upper_stage"):
+    """Mean ejection velocity v̄(𝐿c) [m/s]: Eqs. (2.4), (2.5) averaged over the A/M distribution."""
+    if breakup_type == "explosion":
+        return 0.2 * expected_log_AM(np.log10(L_c), fragment_type) + 1.85
+    else:  # collision
+        return 0.9 * expected_log_AM(np.log10(L_c), fragment_type) + 2.9
+
+
+def differential_size_distribution(L_c, parent_mass=1000, breakup_type="collision"):
+    """𝑛(𝐿c) = -d𝑁/d𝐿c based on Eq. (2.8), (2.9), (2.10) of gdmpidc.md."""
+    if breakup_type == "explosion":
+        # n(L_c) = -d/dL_c[N(L_c)] = -d/dL_c[6*L_c^(-1.6)]
+        return 6 * 1.6 * L_c**(-2.6)
+    else:  # collision
+        # n(L_c) = -d/dL_c[N(L_c)] = -d/dL_c[0.1*L_c^(-1.71)*M_parent^0.75]
+        return 0.1 * 1.71 * L_c**(-2.71) * parent_mass**0.75
+
+
+class ExpansionVelocityTable:
+    """
+    Tabulated Eq. (3.3) of gdmpidc.md for one (breakup_type, fragment_type).
+
+    Stores the running integrals ∫ v̄ 𝑛 d𝐿c and ∫ 𝑛 d𝐿c on a log-spaced 𝐿c grid, so the average
+    expansion velocity over any [𝐿min, 𝐿max] inside the grid is two interpolations and a ratio.
+    The parent-mass factor 𝑀^0.75 of 𝑛(𝐿c) cancels in the ratio, so one table serves every mass.
+    """
+
+    def __init__(self, breakup_type="collision", fragment_type="upper_stage", L_lo=1e-4, L_hi=100.0, n_grid=8193):
+        self.breakup_type = breakup_type
+        self.fragment_type = fragment_type
+        self.L_lo, self.L_hi = L_lo, L_hi
+
+        # Integrate in u = ln(𝐿c) so the power law is resolved evenly across decades
+        self.u = np.linspace(np.log(L_lo), np.log(L_hi), n_grid)
+        L = np.exp(self.u)
+        n = differential_size_distribution(L, 1.0, breakup_type) * L
+        v = expected_ejection_velocity(L, breakup_type, fragment_type)
+        self.cum_numerator = integrate.cumulative_trapezoid(v*n, self.u, initial=0.0)
+        self.cum_denominator = integrate.cumulative_trapezoid(n, self.u, initial=0.0)
+
+    def covers(self, L_min, L_max):
+        return self.L_lo <= L_min and L_max <= self.L_hi
+
+    def __call__(self, L_min, L_max):
+        """Average expansion velocity [m/s] for fragments between 𝐿min and 𝐿max."""
+        u = np.log([L_min, L_max])
+        numerator = np.diff(np.interp(u, self.u, self.cum_numerator))[0]
+        denominator = np.diff(np.interp(u, self.u, self.cum_denominator))[0]
+        return numerator / denominator if denominator != 0 else 0.0
+
+
+@lru_cache(maxsize=None)
+def expansion_velocity_table(breakup_type="collision", fragment_type="upper_stage"):
+    """Shared ExpansionVelocityTable per (breakup_type, fragment_type), built on first use."""
+    return ExpansionVelocityTable(breakup_type, fragment_type)
+
+
+@lru_cache(maxsize=4096)
 def expansion_velocity(parent_mass=1000, L_min=0.001, L_max=1.0, breakup_type="collision"):
     """
     Calculate the average expansion velocity of the debris cloud based on Eq. (3.3) of gdmpidc.md.
+
+    The fragment velocity v̄(𝐿c) is the expected value over the A/M distribution, so the result is
+    deterministic; it is read from the cached ExpansionVelocityTable and memoized per argument set.
+    Ranges outside the table fall back to direct quadrature.
     
     Args:
         parent_mass (float): Mass of the parent object in kg
@@ -179,37 +441,24 @@ def expansion_velocity(parent_mass=1000, L_min=0.001, L_max=1.0, breakup_type="c
     Returns:
         float: Average expansion velocity in m/s
     """
-    # Define differential size distribution function n(L_c) based on Eq. (2.8), (2.9), (2.10)
-    def differential_size_distribution(L_c):
-        if breakup_type == "explosion":
-            # n(L_c) = -d/dL_c[N(L_c)] = -d/dL_c[6*L_c^(-1.6)]
-            return 6 * 1.6 * L_c**(-2.6)
-        else:  # collision
-            # n(L_c) = -d/dL_c[N(L_c)] = -d/dL_c[0.1*L_c^(-1.71)*M_parent^0.75]
-            return 0.1 * 1.71 * L_c**(-2.71) * parent_mass**0.75
-
-    # Define average velocity for fragments of size L_c based on Eq. (2.4), (2.5)
-    def avg_velocity(L_c):
-        # Calculate A/M ratio for this characteristic length
-        log_Lc = log10(L_c)
-        AM_ratio = get_AM_value(log_Lc)
-
-        if breakup_type == "explosion":
-            return 0.2 * log10(AM_ratio) + 1.85
-        else:  # collision
-            return 0.9 * log10(AM_ratio) + 2.9
+    table = expansion_velocity_table(breakup_type)
+    if table.covers(L_min, L_max):
+        return float(table(L_min, L_max))
 
+    # Integrate in u = ln(L_c), dL_c = L_c du, to keep the power law well conditioned
     # Numerator: ∫ v̄(L_c) × n(L_c) dL_c
-    def integrand_numerator(L_c):
-        return avg_velocity(L_c) * differential_size_distribution(L_c)
+    def integrand_numerator(u):
+        L_c = np.exp(u)
+        return float(expected_ejection_velocity(L_c, breakup_type)) * differential_size_distribution(L_c, parent_mass, breakup_type) * L_c
 
     # Denominator: ∫ n(L_c) dL_c
-    def integrand_denominator(L_c):
-        return differential_size_distribution(L_c)
+    def integrand_denominator(u):
+        L_c = np.exp(u)
+        return differential_size_distribution(L_c, parent_mass, breakup_type) * L_c
 
     # Compute the integrals
-    numerator, _ = integrate.quad(integrand_numerator, L_min, L_max)
-    denominator, _ = integrate.quad(integrand_denominator, L_min, L_max)
+    numerator, _ = integrate.quad(integrand_numerator, np.log(L_min), np.log(L_max), limit=200)
+    denominator, _ = integrate.quad(integrand_denominator, np.log(L_min), np.log(L_max), limit=200)
 
     # Return the average expansion velocity
     if denominator != 0:
@@ -221,10 +470,12 @@ def expansion_velocity(parent_mass=1000, L_min=0.001, L_max=1.0, breakup_type="c
 def empirical_parameters(Lc):
     """
         Define empirical parameters for the fragment based on its characteristic length.
-        These parameters have been optimized to achieve the following coverage:
-          - Small fragments (𝐿c ≈ 5 cm): ≳75% inside cloud radius
-          - Medium fragments (𝐿c ≈ 9 cm): ≳90% inside cloud radius
-          - Large fragments (𝐿c ≈ 15 cm): ≳99% inside cloud radius
+        Under the exact r²-weighted radial law (shell_cdf) they give the following coverage
+        at 𝑡 = 0 (SubCloud.inside_fraction):
+          - Small fragments (𝐿c ≈ 5 cm): ≈33% inside cloud radius
+          - Medium fragments (𝐿c ≈ 9 cm): ≈74% inside cloud radius
+          - Large fragments (𝐿c ≈ 15 cm): ≈97% inside cloud radius
+        Coverage falls quickly for smaller 𝐿c, since σ = 𝐿c^(-α)·σ0 grows.
         
         Returns:
             tuple: (μ, ρ0, σ0, α, γ)
@@ -256,6 +507,216 @@ def packing_density(Lc: float) -> float:
         return 0.75           ## More tightly packed due to lower dispersion
 
 
+def empirical_parameter_arrays(Lc):
+    """Vectorized empirical_parameters: (μ, ρ0, σ0, α, γ) arrays shaped like 𝐿c."""
+    Lc = np.asarray(Lc, dtype=float)
+    size_class = np.where(Lc < 0.08, 0, np.where(Lc <= 0.11, 1, 2))
+    table = np.array([empirical_parameters(0.05), empirical_parameters(0.09), empirical_parameters(0.5)])
+    return tuple(table[size_class].T) if Lc.ndim else tuple(table[size_class])
+
+
+def packing_densities(Lc):
+    """Vectorized packing_density."""
+    Lc = np.asarray(Lc, dtype=float)
+    return np.where(Lc < 0.08, packing_density(0.05), np.where(Lc <= 0.11, packing_density(0.09), packing_density(0.5)))
+
+
+def shell_cdf(y, k):
+    """
+    Unnormalized CDF on [0, 𝑦] of the radial law 𝑦² exp(-½(𝑦 - 𝑘)²) of a Gaussian shell.
+
+    With 𝑟 = σ𝑅c·𝑦 and 𝑘 = μ/σ this is the r²·exp(-½((r - μR)/(σR))²) law of Section 1 of gdmpidc.md
+    in units of σ𝑅c.  Writing 𝑥 = 𝑦 - 𝑘 and 𝑎 = -𝑘,
+        √(2π)·∫ = (𝑘² + 1)(Φ(𝑥) - Φ(𝑎)) - 2𝑘(φ(𝑥) - φ(𝑎)) - (𝑥φ(𝑥) - 𝑎φ(𝑎))
+    and the total over [0, ∞) is (𝑘² + 1)Φ(𝑘) + 𝑘φ(𝑘).
+    """
+    x, a = y - k, -k
+    φx, φa = np.exp(-0.5*x**2)/np.sqrt(2*np.pi), np.exp(-0.5*a**2)/np.sqrt(2*np.pi)
+    return (k**2 + 1)*(ndtr(x) - ndtr(a)) - 2*k*(φx - φa) - (x*φx - a*φa)
+
+
+def shell_norm(k):
+    """√(2π)-scaled total of 𝑦² exp(-½(𝑦 - 𝑘)²) over [0, ∞), the normalization of shell_cdf."""
+    return (k**2 + 1)*ndtr(k) + k*np.exp(-0.5*k**2)/np.sqrt(2*np.pi)
+
+
+def invert_shell_cdf(q, k, y, lo, hi, steps):
+    """
+    Safeguarded Newton iterations for shell_cdf(𝑦, 𝑘)/shell_norm(𝑘) = 𝑞 with the root in [lo, hi].
+
+    Every iterate shrinks the bracket; a Newton step leaving it is replaced by bisection, so the
+    iteration cannot diverge in the flat 𝑦³ onset or the Gaussian tail.  Rows stop iterating once
+    their iterate no longer moves.
+    """
+    q, k, y, lo, hi = (np.array(a, dtype=float).ravel() for a in np.broadcast_arrays(q, k, y, lo, hi))
+    norm = shell_norm(k)
+    active = slice(None)
+    for _ in range(steps):
+        qa, ka, ya, na = q[active], k[active], y[active], norm[active]
+        residual = shell_cdf(ya, ka)/na - qa
+        lo[active] = la = np.where(residual < 0, ya, lo[active])
+        hi[active] = ha = np.where(residual > 0, ya, hi[active])
+        pdf = ya**2*np.exp(-0.5*(ya - ka)**2) / (np.sqrt(2*np.pi)*na)
+        with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+            newton = ya - residual/pdf
+        step = np.where((newton >= la) & (newton <= ha), newton, 0.5*(la + ha))
+        moving = np.abs(step - ya) > 1e-14*np.maximum(step, 1.0)
+        y[active] = step
+        if not moving.any():
+            break
+        if not isinstance(active, slice) or np.count_nonzero(moving) < len(moving)//2:
+            active = np.arange(len(y))[active][moving]  # switch to index sets once most rows are done
+    return y
+
+
+def solve_shell_radius(q, k, n_grid=257, steps=40):
+    """Direct inverse of the shell CDF for one 𝑘: bracket 𝑞 on a coarse radius grid, then refine."""
+    q = np.asarray(q, dtype=float)
+    y = np.linspace(max(k - 12.0, 0.0), max(k, 0.0) + 12.0, n_grid)  # the tails beyond 12σ carry < 1e-30
+    F = shell_cdf(y, k) / shell_norm(k)
+    i = np.clip(np.searchsorted(F, q), 1, n_grid - 1)
+    lo, hi = y[i - 1], y[i]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        w = np.clip(np.nan_to_num((q - F[i - 1]) / (F[i] - F[i - 1])), 0, 1)
+    return invert_shell_cdf(q, k, lo + w*(hi - lo), lo, hi, steps)
+
+
+class ShellRadiusGrid:
+    """
+    Tabulated inverse CDF of the radial law 𝑦² exp(-½(𝑦 - 𝑘)²) over 𝑘 = μ/σ and the quantile.
+
+    Nodes sit on 𝑠 = 𝑘/(1 + 𝑘) ∈ [0, 1] × 𝑧 = Φ⁻¹(𝑞) ∈ [-z_max, z_max] and store 𝑔 = 𝑦 - 𝑘, which
+    is smooth in both (the 𝑦³ onset at small 𝑘 is smooth in 𝑧, and 𝑔 → 𝑧 linearly in 1 - 𝑠 as
+    the shell becomes Gaussian, so 𝑠 = 1 is an ordinary node).  Along 𝑧 every cell is a cubic
+    Hermite polynomial with the exact slope d𝑦/d𝑧 = φ(𝑧)/𝑓(𝑦); along 𝑠 four neighbouring columns
+    are blended by cubic Lagrange weights.  A lookup is then one ndtri and a few gathers, with
+    no iteration, and agrees with solve_shell_radius to ~1e-7 (in units of σ𝑅c).
+    """
+
+    def __init__(self, n_s=257, n_z=257, z_max=9.0):
+        self.s = np.linspace(0.0, 1.0, n_s)
+        self.z = np.linspace(-z_max, z_max, n_z)
+        self.inverse_step = 1/(self.z[1] - self.z[0])
+        q = ndtr(self.z)
+
+        # Bracket every node on a coarse radius grid of its column, then refine all nodes at once
+        k = self.s[:-1]/(1 - self.s[:-1])
+        y_coarse = np.linspace(np.maximum(k - 12.0, 0.0), k + 12.0, 257, axis=1)  # the tails beyond 12σ carry < 1e-30
+        F = shell_cdf(y_coarse, k[:, np.newaxis]) / shell_norm(k)[:, np.newaxis]
+        i = np.clip([np.searchsorted(F_k, q) for F_k in F], 1, y_coarse.shape[1] - 1)
+        rows = np.arange(len(k))[:, np.newaxis]
+        lo, hi, F_lo, F_hi = y_coarse[rows, i - 1], y_coarse[rows, i], F[rows, i - 1], F[rows, i]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            w = np.clip(np.nan_to_num((q - F_lo) / (F_hi - F_lo)), 0, 1)
+        kk = np.broadcast_to(k[:, np.newaxis], lo.shape)
+        y = invert_shell_cdf(np.broadcast_to(q, lo.shape), kk, lo + w*(hi - lo), lo, hi, 60).reshape(lo.shape)
+
+        g = np.vstack((y - kk, self.z))  # 𝑠 = 1: the Gaussian limit 𝑦 = 𝑘 + 𝑧
+        with np.errstate(divide="ignore", over="ignore"):
+            slope = shell_norm(kk)*np.exp(-0.5*self.z**2 + 0.5*(y - kk)**2 - 2*np.log(y))
+        slope = np.vstack((np.where(np.isfinite(slope), slope, 0.0), np.ones(n_z)))
+
+        # Cubic Hermite coefficients of every 𝑧 cell in 𝑡 ∈ [0, 1], one flat array per power of 𝑡
+        h = self.z[1] - self.z[0]
+        y0, y1, m0, m1 = g[:, :-1], g[:, 1:], h*slope[:, :-1], h*slope[:, 1:]
+        self.coefficients = [np.ascontiguousarray(c).ravel() for c in (y0, m0, 3*(y1 - y0) - 2*m0 - m1, 2*(y0 - y1) + m0 + m1)]
+
+    def stencil(self, k):
+        """First 𝑠 column and the four cubic Lagrange weights of the columns interpolating 𝑘."""
+        u = k/(1 + k)*(len(self.s) - 1)
+        first = np.clip(u.astype(np.intp) - 1, 0, len(self.s) - 4)
+        x = u - first
+        return first, ((1 - x)*(x - 2)*(x - 3)/6, x*(x - 2)*(x - 3)/2, x*(1 - x)*(x - 3)/2, x*(x - 1)*(x - 2)/6)
+
+    def cells(self, q):
+        """𝑧 cell, position 𝑡 ∈ [0, 1] within it, and the rows whose 𝑧 lies beyond the grid."""
+        v = (ndtri(q) - self.z[0])*self.inverse_step
+        clipped = np.clip(v, 0, len(self.z) - 1)
+        outside = np.flatnonzero(clipped != v)
+        j = np.minimum(clipped.astype(np.intp), len(self.z) - 2)
+        return j, clipped - j, outside
+
+    def column(self, k):
+        """ShellRadiusTable of one 𝑘: the Hermite coefficients blended across its four 𝑠 columns."""
+        first, weights = self.stencil(np.float64(k))
+        n = len(self.z) - 1
+        return ShellRadiusTable(k, self, [sum(w*c[(first + col)*n:(first + col + 1)*n] for col, w in enumerate(weights)) for c in self.coefficients])
+
+    def __call__(self, q, k):
+        """Shell radii 𝑦 [units of σ𝑅c] at quantiles 𝑞 for element-wise 𝑘."""
+        q, k = np.broadcast_arrays(np.asarray(q, dtype=float), np.asarray(k, dtype=float))
+        shape, q, k = q.shape, q.ravel(), k.ravel()
+        j, t, outside = self.cells(q)
+        first, weights = self.stencil(k)
+        n = len(self.z) - 1
+        y = k.copy()
+        for col, w in enumerate(weights):
+            index = (first + col)*n + j
+            c0, c1, c2, c3 = (c.take(index) for c in self.coefficients)
+            y += w*(c0 + t*(c1 + t*(c2 + t*c3)))
+        # Quantiles beyond ±z_max (probability ~1e-19): solve those directly
+        for row in outside:
+            y[row] = solve_shell_radius(q[row:row + 1], k[row])[0]
+        return y.reshape(shape)
+
+
+class ShellRadiusTable:
+    """
+    ShellRadiusGrid restricted to one 𝑘 = μ/σ (one size bin): a single column of Hermite cells in
+    𝑧, so a lookup costs one ndtri, one gather and a cubic.  Built from the grid's columns (no
+    root finding), it gives the same radii as the grid lookup with a per-row 𝑘.
+    """
+
+    def __init__(self, k, grid, coefficients):
+        self.k = float(k)
+        self.grid = grid
+        self.coefficients = coefficients
+
+    def __call__(self, q):
+        """Shell radii 𝑦 [units of σ𝑅c] at quantiles 𝑞 ∈ (0, 1)."""
+        q = np.asarray(q, dtype=float).ravel()
+        j, t, outside = self.grid.cells(q)
+        c0, c1, c2, c3 = (c.take(j) for c in self.coefficients)
+        y = self.k + (c0 + t*(c1 + t*(c2 + t*c3)))
+        if len(outside):
+            y[outside] = solve_shell_radius(q[outside], self.k)
+        return y
+
+
+@lru_cache(maxsize=None)
+def shell_radius_grid():
+    """Shared ShellRadiusGrid, built on first use."""
+    return ShellRadiusGrid()
+
+
+@lru_cache(maxsize=4096)
+def shell_radius_table(k):
+    """Shared ShellRadiusTable per 𝑘 = μ/σ (one per size bin and time)."""
+    return shell_radius_grid().column(k)
+
+
+def shell_radius_quantiles(q, k):
+    """
+    Inverse CDF of the radial law 𝑦² exp(-½(𝑦 - 𝑘)²), vectorized over 𝑞 and 𝑘.
+
+    The mapping is monotone in 𝑞, so fragments keep their radial rank as 𝑘 changes with time.
+    A scalar 𝑘 (the fragments of one bin) goes through its cached ShellRadiusTable; an array 𝑘
+    (a continuum of sizes, or several bins at once) through the shared ShellRadiusGrid.  Both
+    are table lookups without iteration.
+
+    Args:
+        𝑞 (np.ndarray): radial quantiles in (0, 1)
+        𝑘 (float | np.ndarray): μ/σ, scalar or shaped like 𝑞
+
+    Returns:
+        np.ndarray: shell radii in units of σ𝑅c
+    """
+    if np.ndim(k) == 0:
+        q = np.asarray(q, dtype=float)
+        return shell_radius_table(float(k))(q).reshape(q.shape)
+    return shell_radius_grid()(q, k)
+
+
 def cumulative_distribution(Lc: float, M_parent: float = None, breakup_type: str ="collision") -> float:
     """Cumulative Distibution function (𝑁); represents the number of particles greater than 𝐿c."""
     if breakup_type == "collision":
@@ -264,6 +725,22 @@ def cumulative_distribution(Lc: float, M_parent: float = None, breakup_type: str
         return 6*Lc**(-1.71)
 
 
+def sample_characteristic_lengths(n: int, min_size: float = 0.001, max_size: float = 1.0, rng=None) -> np.ndarray:
+    """
+    Draw 𝑛 characteristic lengths [m] from the power law 𝑁(𝐿c) ∝ 𝐿c^(-1.71) of
+    cumulative_distribution, restricted to [min_size, max_size], by inverse CDF.
+    """
+    rng = random if rng is None else rng
+    β = 1.71
+    a, b = min_size**(-β), max_size**(-β)
+    return (a - rng.uniform(0, 1, n)*(a - b))**(-1/β)
+
+
+def expected_fragment_count(parent_mass: float, min_size: float = 0.001, max_size: float = 1.0, breakup_type: str = "collision") -> float:
+    """Expected number of fragments with min_size ≤ 𝐿c ≤ max_size, 𝑁(min_size) - 𝑁(max_size), unrounded."""
+    return cumulative_distribution(min_size, parent_mass, breakup_type) - cumulative_distribution(max_size, parent_mass, breakup_type)
+
+
 def subrange_count(L1: float, L2: float, parent_mass: float, breakup_type: str = "collision") -> int:
     """Number of fragments between lengths 𝐿1 and 𝐿2 where 𝐿2 > 𝐿1."""
     if breakup_type == "collision":
@@ -3,14 +3,20 @@
 __author__ = "Kamyar Modjtahedzadeh, Claude 3.7 Sonnet, Grok 3, Claude 3.5 Sonnet V2"
 __date__ = "May 20, 2025 - June 6, 2025"
 
+import warnings
+
+from scipy.stats import qmc
+
 try:
     # When imported as a module from parent directory
     from src.gdmpidc import *
+    from src import instrumentation
 except ImportError:
     # When run directly from src directory
     from gdmpidc import *
+    import instrumentation
 
-def get_entry_exit(radius, center=(0, 0, 0), diameter=False):
+def get_entry_exit(radius, center=(0, 0, 0), diameter=False, rng=None):
     """
     Generate two random points (entry and exit) on the surface of a sphere.
     
@@ -19,16 +25,19 @@ def get_entry_exit(radius, center=(0, 0, 0), diameter=False):
         - center (tuple): Center of the sphere in (𝑥,𝑦,𝑧) coordinates. Default is (0,0,0).
         - diameter (bool): If True, the points will be diametrically opposite.
                        If False, the points will not be diametrically opposite. Default is False.
+        - rng (np.random.Generator): random stream to draw from. Default is the global np.random state.
     
     Returns:
         - tuple: ((𝑥1,𝑦1,𝑧1), (𝑥2,𝑦2,𝑧2)) - entry and exit points on the sphere's surface.
     """
     
+    rng = np.random if rng is None else rng
+
     # Convert center to numpy array for vectorized operations
     center = np.array(center)
     
     # Generate first random point on unit sphere using Gaussian method
-    vec1 = np.random.normal(0, 1, 3)
+    vec1 = rng.normal(0, 1, 3)
     vec1 = vec1 / np.linalg.norm(vec1)
     
     if diameter:
@@ -37,7 +46,7 @@ def get_entry_exit(radius, center=(0, 0, 0), diameter=False):
     else:
         # Keep generating random points until we get one that's not diametrically opposite
         while True:
-            vec2 = np.random.normal(0, 1, 3)
+            vec2 = rng.normal(0, 1, 3)
             vec2 = vec2 / np.linalg.norm(vec2)
             
             # Check if points are not diametrically opposite
@@ -52,7 +61,7 @@ def get_entry_exit(radius, center=(0, 0, 0), diameter=False):
     
     return entry_point, exit_point
 
-def importance_sample_entry_exit(R_c: float, center: tuple = None, mu: float = 0.6, sigma_IS: float = None, avoid_diameter: bool = False, max_attempts: int = 10000):
+def importance_sample_entry_exit(R_c: float, center: tuple = None, mu: float = 0.6, sigma_IS: float = None, avoid_diameter: bool = False, max_attempts: int = 10000, rng=None):
     """
     Generate entry/exit points biased toward trajectories passing near mu*R_c
     using rejection sampling.
@@ -64,11 +73,14 @@ def importance_sample_entry_exit(R_c: float, center: tuple = None, mu: float = 0
         - sigma_IS: importance sampling width (default: 0.2*R_c)
         - avoid_diameter: if True, ensure trajectory doesn't pass through sphere
         - max_attempts: maximum rejection sampling attempts
+        - rng: np.random.Generator to draw from (default: global np.random state)
     
     Returns:
         - entry_point, exit_point: 3D coordinates on sphere
     """
 
+    rng = np.random if rng is None else rng
+
     if center is None:
         center = np.array([0.0, 0.0, 0.0])
     else:
@@ -82,18 +94,18 @@ def importance_sample_entry_exit(R_c: float, center: tuple = None, mu: float = 0
     
     for _ in range(max_attempts):
         # Step 1: Generate uniform entry/exit points on unit sphere
-        u1 = np.random.uniform(-1, 1)
+        u1 = rng.uniform(-1, 1)
         theta1 = np.arccos(u1)
-        phi1 = np.random.uniform(0, 2*np.pi)
+        phi1 = rng.uniform(0, 2*np.pi)
         entry_unit = np.array([
             np.sin(theta1) * np.cos(phi1),
             np.sin(theta1) * np.sin(phi1),
             np.cos(theta1)
         ])
         
-        u2 = np.random.uniform(-1, 1)
+        u2 = rng.uniform(-1, 1)
         theta2 = np.arccos(u2)
-        phi2 = np.random.uniform(0, 2*np.pi)
+        phi2 = rng.uniform(0, 2*np.pi)
         exit_unit = np.array([
             np.sin(theta2) * np.cos(phi2),
             np.sin(theta2) * np.sin(phi2),
@@ -146,7 +158,7 @@ def importance_sample_entry_exit(R_c: float, center: tuple = None, mu: float = 0
         importance = np.exp(-l_min**2 / (2 * sigma_IS**2))
         
         # Accept/reject based on importance
-        if np.random.uniform(0, 1) < importance / max_importance:
+        if rng.uniform(0, 1) < importance / max_importance:
             return entry, exit_point
     
     # If we fail, return uniform sample (with diameter check)
@@ -154,10 +166,206 @@ def importance_sample_entry_exit(R_c: float, center: tuple = None, mu: float = 0
     # Could fall back to uniform sampling here
     if avoid_diameter:
         # Use your existing get_entry_exit function as fallback
-        return get_entry_exit(R_c, center, diameter=avoid_diameter)
+        return get_entry_exit(R_c, center, diameter=avoid_diameter, rng=rng)
     else:
         return entry, exit_point
 
+def get_entry_exit_batch(n, radius, center=(0, 0, 0), diameter=False, rng=None):
+    """
+    Vectorized get_entry_exit: 𝑛 entry/exit pairs on the surface of a sphere.
+
+    The non-diameter rejection (dot product > -0.98) is applied with a mask and only the
+    rejected exits are redrawn, round by round, so the distribution matches get_entry_exit.
+
+    Parameters:
+        - n (int): number of chords
+        - radius, center, diameter, rng: as in get_entry_exit
+
+    Returns:
+        - np.ndarray: (𝑛,2,3) array; [:, 0] entry points, [:, 1] exit points
+    """
+
+    rng = np.random if rng is None else rng
+    center = np.asarray(center, dtype=float)
+
+    vec1 = rng.normal(0, 1, (n, 3))
+    vec1 /= np.linalg.norm(vec1, axis=1)[:, np.newaxis]
+
+    if diameter:
+        vec2 = -vec1
+    else:
+        vec2 = np.empty((n, 3))
+        pending = np.arange(n)
+        while len(pending):
+            draw = rng.normal(0, 1, (len(pending), 3))
+            draw /= np.linalg.norm(draw, axis=1)[:, np.newaxis]
+            ok = np.einsum("ij,ij->i", vec1[pending], draw) > -0.98
+            vec2[pending[ok]] = draw[ok]
+            pending = pending[~ok]
+            instrumentation.count("chords.rejection_attempts", len(ok))
+
+    return np.stack((center + radius*vec1, center + radius*vec2), axis=1)
+
+def importance_sample_entry_exit_batch(n: int, R_c: float, center: tuple = None, mu: float = 0.6, sigma_IS: float = None, avoid_diameter: bool = False, max_attempts: int = 10000, rng=None):
+    """
+    Vectorized importance_sample_entry_exit: 𝑛 chords biased toward trajectories passing near mu*R_c.
+
+    Every round draws one uniform candidate for each chord still pending and accepts it with
+    probability exp(-𝑙min²/(2σ_IS²)); accepted chords are removed and the rest refilled, so each
+    chord sees the same acceptance test as the scalar sampler.  Chords still pending after
+    max_attempts rounds fall back exactly as importance_sample_entry_exit does.
+
+    Parameters:
+        - n: number of chords
+        - R_c, center, mu, sigma_IS, avoid_diameter, max_attempts, rng: as in importance_sample_entry_exit
+
+    Returns:
+        - np.ndarray: (𝑛,2,3) array; [:, 0] entry points, [:, 1] exit points
+    """
+
+    rng = np.random if rng is None else rng
+    center = np.zeros(3) if center is None else np.asarray(center, dtype=float)
+    if sigma_IS is None:
+        sigma_IS = 0.2 * R_c
+    peak_radius = mu * R_c
+
+    def unit_vectors(m):
+        cos_theta = rng.uniform(-1, 1, m)
+        sin_theta = np.sqrt(1 - cos_theta**2)
+        phi = rng.uniform(0, 2*np.pi, m)
+        return np.column_stack((sin_theta*np.cos(phi), sin_theta*np.sin(phi), cos_theta))
+
+    chords = np.empty((n, 2, 3))
+    pending = np.arange(n)
+    for _ in range(max_attempts):
+        if len(pending) == 0:
+            break
+        m = len(pending)
+        entry_relative = R_c*unit_vectors(m)
+        exit_relative = R_c*unit_vectors(m)
+        chords[pending, 0] = center + entry_relative
+        chords[pending, 1] = center + exit_relative
+
+        direction = exit_relative - entry_relative
+        length = np.linalg.norm(direction, axis=1)
+        direction_norm = direction / length[:, np.newaxis]
+        t_closest = -np.einsum("ij,ij->i", entry_relative, direction_norm)
+        dist_to_center = np.linalg.norm(entry_relative + t_closest[:, np.newaxis]*direction_norm, axis=1)
+
+        # Check diameter constraint if needed
+        allowed = np.ones(m, dtype=bool)
+        if avoid_diameter:
+            allowed = ~((0 < t_closest) & (t_closest < length) & (dist_to_center < R_c))
+
+        importance = np.exp(-np.abs(dist_to_center - peak_radius)**2 / (2 * sigma_IS**2))
+        accepted = allowed & (rng.uniform(0, 1, m) < importance)
+        pending = pending[~accepted]
+        instrumentation.count("chords.rejection_attempts", m)
+
+    if len(pending):
+        print(f"Warning: Importance sampling failed after {max_attempts} attempts for {len(pending)} chords")
+        if avoid_diameter:
+            chords[pending] = get_entry_exit_batch(len(pending), R_c, center, diameter=avoid_diameter, rng=rng)
+
+    return chords
+
+def impact_parameter_quantiles(u, mu: float = 0.6, s: float = 0.2, n_grid: int = 4097) -> np.ndarray:
+    """
+    Inverse CDF of the relative impact parameter 𝑐 = 𝑙min/R_c of importance-sampled chords.
+
+    Two uniform points on the sphere give 𝑐 the density 2𝑐 on [0, 1]; accepting them with
+    probability exp(-(𝑐 - μ)²/(2𝑠²)) leaves 𝑓(𝑐) ∝ 𝑐·exp(-(𝑐 - μ)²/(2𝑠²)), whose CDF is
+        𝐹(𝑐) ∝ μ(Φ(𝑥) - Φ(𝑥0)) - 𝑠(φ(𝑥) - φ(𝑥0)),  𝑥 = (𝑐 - μ)/𝑠,  𝑥0 = -μ/𝑠.
+    𝑢 is interpolated on a tabulated 𝐹 and refined with two Newton steps.
+
+    Args:
+        𝑢 (np.ndarray): uniforms in [0, 1)
+        mu, s: peak and width of the importance weight relative to R_c
+
+    Returns:
+        np.ndarray: 𝑐 ∈ [0, 1] shaped like 𝑢
+    """
+    def cdf(c):
+        x = (c - mu)/s
+        return mu*(ndtr(x) - ndtr(-mu/s)) - s*(np.exp(-0.5*x**2) - np.exp(-0.5*(mu/s)**2))/np.sqrt(2*np.pi)
+
+    grid = np.linspace(0.0, 1.0, n_grid)
+    total = cdf(1.0)
+    c = np.interp(u, cdf(grid)/total, grid)
+    for _ in range(2):
+        pdf = c*np.exp(-0.5*((c - mu)/s)**2)/(np.sqrt(2*np.pi)*total)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            step = (cdf(c)/total - u)/pdf
+        c = np.clip(np.where(np.isfinite(step), c - step, c), 0.0, 1.0)
+    return c
+
+class QMCChordSampler:
+    """
+    Randomized quasi-Monte Carlo / stratified chords with the distribution of
+    importance_sample_entry_exit_batch (avoid_diameter=False).
+
+    A chord is a point of the unit 4-cube: one coordinate sets the relative impact parameter
+    through impact_parameter_quantiles, two the (uniform) line direction and one the azimuth of
+    the closest-approach point around it.  Each of the independent replicates owns a scrambled
+    Sobol or Halton engine (or draws Latin hypercube batches for "stratified"), so the spread of
+    the replicate estimates gives an unbiased standard error.
+
+    Args:
+        R_c (float): cloud radius
+        method (str): "sobol", "halton" or "stratified"
+        replicates (int): number of independently randomized point sets
+        rng (np.random.Generator | int): seeds the scrambling of every replicate
+    """
+
+    methods = ("sobol", "halton", "stratified")
+
+    def __init__(self, R_c: float, method: str = "sobol", replicates: int = 16, center: tuple = None, mu: float = 0.6, sigma_IS: float = None, rng=None):
+        if method not in self.methods:
+            raise ValueError(f"Unknown QMC method {method!r}; expected one of {self.methods}")
+        self.R_c = R_c
+        self.method = method
+        self.replicates = replicates
+        self.center = np.zeros(3) if center is None else np.asarray(center, dtype=float)
+        self.mu = mu
+        self.s = (0.2 * R_c if sigma_IS is None else sigma_IS) / R_c
+        streams = np.random.default_rng(rng).spawn(replicates)
+        engine = {"sobol": qmc.Sobol, "halton": qmc.Halton, "stratified": qmc.LatinHypercube}[method]
+        self.engines = [engine(4, scramble=True, rng=stream) for stream in streams]
+
+    def chords(self, replicate: int, n: int) -> np.ndarray:
+        """
+        The next 𝑛 chords of one replicate (Sobol balance is best for powers of two; a
+        stratified call is a fresh Latin hypercube of 𝑛 points).
+
+        Returns:
+            np.ndarray: (𝑛,2,3) array; [:, 0] entry points, [:, 1] exit points
+        """
+        engine = self.engines[replicate]
+        if self.method == "sobol":
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)  # balance warning for n not a power of two
+                u = engine.random(n)
+        else:
+            u = engine.random(n)
+        instrumentation.count("chords.qmc_points", n)
+
+        c = impact_parameter_quantiles(u[:, 0], self.mu, self.s)
+        cos_theta = 2*u[:, 1] - 1
+        sin_theta = np.sqrt(1 - cos_theta**2)
+        phi = 2*np.pi*u[:, 2]
+        direction = np.column_stack((sin_theta*np.cos(phi), sin_theta*np.sin(phi), cos_theta))
+
+        # Orthonormal basis (e1, e2) of the plane perpendicular to each direction
+        helper = np.where(np.abs(direction[:, [2]]) < 0.9, [[0.0, 0.0, 1.0]], [[1.0, 0.0, 0.0]])
+        e1 = np.cross(direction, helper)
+        e1 /= np.linalg.norm(e1, axis=1)[:, np.newaxis]
+        e2 = np.cross(direction, e1)
+        psi = 2*np.pi*u[:, 3]
+        closest = self.R_c*c[:, np.newaxis]*(np.cos(psi)[:, np.newaxis]*e1 + np.sin(psi)[:, np.newaxis]*e2)
+        half_length = self.R_c*np.sqrt(1 - c**2)[:, np.newaxis]
+
+        return np.stack((self.center + closest - half_length*direction, self.center + closest + half_length*direction), axis=1)
+
 def line_parametric_3d(p1, p2):
     """
     Compute the parametric equation of the 3D line through points 𝑝1 and 𝑝2.
@@ -224,6 +432,250 @@ def count_points_near_line(line, points, distance) -> int:
     return count
 
 
+class VoxelGrid:
+    """
+    Uniform voxel grid over a fixed point set for cylinder (point-to-line distance) queries.
+
+    Points are bucketed by cell and stored cell-contiguous (CSR layout: ``cell_start[c]`` to
+    ``cell_start[c+1]``), so a query gathers only the cells the cylinder around a line can touch
+    and runs the exact distance test on those candidates.  Build once per cloud, query per chord.
+    """
+
+    def __init__(self, points, cell_size: float = None, points_per_cell: int = 16, max_cells: int = 2**22):
+        """
+        Args:
+            points (np.ndarray): (𝑁,3) fragment positions
+            cell_size (float): voxel edge length [m]; chosen from points_per_cell when omitted
+            points_per_cell (int): target mean occupancy used to pick cell_size
+            max_cells (int): upper bound on the number of voxels
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        self.n_points = len(points)
+
+        lo = points.min(axis=0) if self.n_points else np.zeros(3)
+        hi = points.max(axis=0) if self.n_points else np.ones(3)
+        extent = np.maximum(hi - lo, 1e-9)
+        if cell_size is None:
+            cell_size = (np.prod(extent) * points_per_cell / max(self.n_points, 1))**(1/3)
+        cell_size = max(cell_size, (np.prod(extent) / max_cells)**(1/3))
+
+        self.origin = lo
+        self.cell_size = cell_size
+        self.shape = np.maximum(np.ceil(extent / cell_size).astype(np.int64), 1)
+
+        cell_ids = self._cell_ids(points)
+        self.order = np.argsort(cell_ids, kind="stable")        # grid row → original point index
+        self.points = np.ascontiguousarray(points[self.order])  # points sorted by cell
+        counts = np.bincount(cell_ids, minlength=int(np.prod(self.shape)))
+        self.cell_start = np.concatenate(([0], np.cumsum(counts)))
+
+    @classmethod
+    def from_arrays(cls, origin, cell_size: float, shape, points: np.ndarray, cell_start: np.ndarray, order: np.ndarray = None) -> "VoxelGrid":
+        """
+        Grid over the already bucketed points and cell_start of a built grid (e.g. attached from
+        shared memory), without copying them.  order is only needed by nearest_to_line_by_label.
+        """
+        grid = cls.__new__(cls)
+        grid.origin = np.asarray(origin, dtype=np.float64)
+        grid.cell_size = float(cell_size)
+        grid.shape = np.asarray(shape, dtype=np.int64)
+        grid.points, grid.cell_start, grid.order = points, cell_start, order
+        grid.n_points = len(points)
+        return grid
+
+    def _cell_ids(self, points):
+        ijk = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        ijk = np.clip(ijk, 0, self.shape - 1)
+        return (ijk[:, 0]*self.shape[1] + ijk[:, 1])*self.shape[2] + ijk[:, 2]
+
+    def candidate_cells(self, p1, p2, distance: float) -> np.ndarray:
+        """
+        Linear ids of every voxel that may hold a point within 𝑑 of the (infinite) line 𝑝1𝑝2.
+
+        The line is walked slab by slab along its dominant axis; within each slab the other two
+        coordinates of the line, widened by 𝑑, bound a rectangle of cells.
+        """
+        p1 = np.asarray(p1, dtype=np.float64)
+        D = np.asarray(p2, dtype=np.float64) - p1
+        a = int(np.argmax(np.abs(D)))
+        b, c = [axis for axis in range(3) if axis != a]
+        h, o, n = self.cell_size, self.origin, self.shape
+
+        # Parameter interval of each slab along axis a, widened by 𝑑
+        k = np.arange(n[a])
+        t0 = (o[a] + k*h - distance - p1[a]) / D[a]
+        t1 = (o[a] + (k + 1)*h + distance - p1[a]) / D[a]
+
+        def cell_range(axis):
+            e0, e1 = p1[axis] + t0*D[axis], p1[axis] + t1*D[axis]
+            lo = np.floor((np.minimum(e0, e1) - distance - o[axis]) / h).astype(np.int64)
+            hi = np.floor((np.maximum(e0, e1) + distance - o[axis]) / h).astype(np.int64)
+            return np.maximum(lo, 0), np.minimum(hi, n[axis] - 1)
+
+        b_lo, b_hi = cell_range(b)
+        c_lo, c_hi = cell_range(c)
+        nb = np.maximum(b_hi - b_lo + 1, 0)
+        nc = np.maximum(c_hi - c_lo + 1, 0)
+        per_slab = nb*nc
+        total = int(per_slab.sum())
+        if total == 0:
+            return np.empty(0, dtype=np.int64)
+
+        # Enumerate the (𝑏, 𝑐) rectangle of every slab without a Python loop
+        slab = np.repeat(k, per_slab)
+        j = np.arange(total) - np.repeat(np.cumsum(per_slab) - per_slab, per_slab)
+        ijk = np.empty((total, 3), dtype=np.int64)
+        ijk[:, a] = slab
+        ijk[:, b] = b_lo[slab] + j // nc[slab]
+        ijk[:, c] = c_lo[slab] + j % nc[slab]
+        return (ijk[:, 0]*n[1] + ijk[:, 1])*n[2] + ijk[:, 2]
+
+    def candidates(self, p1, p2, distance: float) -> np.ndarray:
+        """Rows of self.points lying in the voxels returned by candidate_cells."""
+        cells = self.candidate_cells(p1, p2, distance)
+        starts = self.cell_start[cells]
+        lengths = self.cell_start[cells + 1] - starts
+        keep = lengths > 0
+        starts, lengths = starts[keep], lengths[keep]
+        total = int(lengths.sum())
+        # Concatenate the ranges [start, start + length) of every occupied cell
+        offsets = np.cumsum(lengths) - lengths
+        return np.repeat(starts - offsets, lengths) + np.arange(total)
+
+    def count_near_line(self, p1, p2, distance: float, any_hit: bool = False, chunk: int = 65536) -> int:
+        """
+        Number of points within 𝑑 of the infinite line through 𝑝1 and 𝑝2.
+
+        Args:
+            any_hit (bool): stop at the first point found and return 1 (0 if none)
+            chunk (int): candidates tested per block in any-hit mode
+
+        Returns:
+            int: same count as count_points_near_line / count_points_near_line_optimized
+        """
+        rows = self.candidates(p1, p2, distance)
+        if len(rows) == 0:
+            return 0
+
+        p1 = np.asarray(p1, dtype=np.float64)
+        line_dir = np.asarray(p2, dtype=np.float64) - p1
+        line_dir = line_dir / np.linalg.norm(line_dir)
+
+        step = chunk if any_hit else len(rows)
+        count = 0
+        for start in range(0, len(rows), step):
+            pts = self.points[rows[start:start + step]]
+            rel = pts - p1
+            closest = p1 + (rel @ line_dir)[:, np.newaxis]*line_dir
+            hits = int(np.count_nonzero(np.linalg.norm(pts - closest, axis=1) <= distance))
+            if any_hit and hits:
+                return 1
+            count += hits
+        return count
+
+    def nearest_to_line(self, p1, p2, max_distance: float) -> float:
+        """
+        Distance from the infinite line through 𝑝1 and 𝑝2 to its nearest point, searched up
+        to max_distance (inf when no point is that close).
+        """
+        rows = self.candidates(p1, p2, max_distance)
+        if len(rows) == 0:
+            return np.inf
+
+        p1 = np.asarray(p1, dtype=np.float64)
+        line_dir = np.asarray(p2, dtype=np.float64) - p1
+        line_dir = line_dir / np.linalg.norm(line_dir)
+
+        pts = self.points[rows]
+        rel = pts - p1
+        closest = p1 + (rel @ line_dir)[:, np.newaxis]*line_dir
+        nearest = float(np.linalg.norm(pts - closest, axis=1).min())
+        return nearest if nearest <= max_distance else np.inf
+
+    def nearest_to_line_by_label(self, p1, p2, max_distance: float, labels, n_labels: int) -> np.ndarray:
+        """
+        nearest_to_line separately for every label.
+
+        Args:
+            labels (np.ndarray): integer label in [0, n_labels) of every point, in the order the
+                                 grid was built from
+
+        Returns:
+            np.ndarray: (n_labels,) distances, inf for labels without a point within max_distance
+        """
+        nearest = np.full(n_labels, np.inf)
+        rows = self.candidates(p1, p2, max_distance)
+        if len(rows) == 0:
+            return nearest
+
+        p1 = np.asarray(p1, dtype=np.float64)
+        line_dir = np.asarray(p2, dtype=np.float64) - p1
+        line_dir = line_dir / np.linalg.norm(line_dir)
+
+        pts = self.points[rows]
+        rel = pts - p1
+        closest = p1 + (rel @ line_dir)[:, np.newaxis]*line_dir
+        distance = np.linalg.norm(pts - closest, axis=1)
+        near = distance <= max_distance
+        np.minimum.at(nearest, np.asarray(labels)[self.order[rows[near]]], distance[near])
+        return nearest
+
+
+def level_of_detail(points, budget: int = 50_000, cells: int = 64, exponent: float = 0.5, rng=None) -> tuple:
+    """
+    Density-aware decimation of a point cloud to at most budget points for plotting.
+
+    Points are bucketed on a cells³ grid over their bounding box and voxel 𝑣 keeps
+    𝑘_v = min(𝑛_v, ⌈α·𝑛_v^γ⌉) random points (γ = exponent), with α found by bisection so that
+    Σ𝑘_v ≤ budget.  For γ < 1 sparse voxels (outliers, the outer halo) keep every point while
+    dense ones are thinned, yet 𝑘_v still grows with 𝑛_v so the shell stays the densest
+    feature.  γ = 1 is plain uniform subsampling, γ = 0 a per-voxel cap.
+
+    Args:
+        points (np.ndarray): (𝑁,3) positions
+        budget (int): maximum number of points kept (at least 1)
+        cells (int): voxels per axis (halved while there are more occupied voxels than budget)
+        rng (np.random.Generator | int): selection within voxels
+
+    Returns:
+        tuple: (indices of the kept points, weights 𝑛_v/𝑘_v = points each kept one stands for)
+    """
+
+    if budget < 1:
+        raise ValueError(f"level_of_detail needs a budget of at least 1 point, got {budget}")
+    points = np.asarray(points, dtype=float).reshape(-1, 3)
+    n = len(points)
+    if n <= budget:
+        return np.arange(n), np.ones(n)
+    rng = np.random.default_rng(rng)
+
+    low, extent = points.min(axis=0), np.ptp(points, axis=0)
+    cells = max(int(cells), 1)
+    while True:
+        cell = np.maximum(extent / cells, np.finfo(float).tiny)
+        ijk = np.minimum(((points - low) / cell).astype(np.int64), cells - 1)
+        _, voxel, counts = np.unique((ijk[:, 0]*cells + ijk[:, 1])*cells + ijk[:, 2], return_inverse=True, return_counts=True)
+        if len(counts) <= budget or cells == 1:
+            break
+        cells = max(cells // 2, 1)
+
+    def kept(alpha):
+        return np.minimum(counts, np.ceil(alpha * counts**exponent)).astype(np.int64)
+
+    # Largest α whose total stays within budget (α = max 𝑛^(1-γ) would keep everything)
+    lo, hi = 0.0, float((counts**(1 - exponent)).max())
+    for _ in range(60):
+        mid = 0.5*(lo + hi)
+        lo, hi = (mid, hi) if kept(mid).sum() <= budget else (lo, mid)
+    k = np.maximum(kept(lo), 1)  # at α = 0 one point per voxel, within budget by the grid choice
+
+    # Random order within each voxel; keep the first 𝑘_v
+    order = np.lexsort((rng.random(n), voxel))
+    start = np.r_[0, np.cumsum(counts)[:-1]]
+    rank = np.arange(n) - start[voxel[order]]
+    selected = np.sort(order[rank < k[voxel[order]]])
+    return selected, (counts / k)[voxel[selected]]
+
 if __name__ == "__main__":
     cloud = Cloud(100e3, 10,)
     p1, p2 = importance_sample_entry_exit(cloud.radius)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+
+__author__ = "Kamyar Modjtahedzadeh"
+__date__ = "October 18, 2026"
+
+"""
+    Structured instrumentation for the simulation pipeline.
+
+    Named spans time pipeline stages (cloud build, per-bin sampling, inside-radius filtering,
+    chord generation, hit kernel, ...), counters accumulate quantities (fragments generated/kept,
+    rejection-sampling attempts, bytes allocated, ...) and gauges record point values (trials/sec).
+    Events go to pluggable sinks (JSONLinesSink, MemoryCollector).  With no sink enabled, span()
+    returns a shared no-op context manager and count()/gauge() return after one check.
+
+        collector = MemoryCollector()
+        with instrumented(collector):
+            cloud = Cloud(1e4, 1000)
+        print(collector.span_totals(), collector.counters)
+"""
+
+from contextlib import contextmanager
+import json
+import time
+
+_sinks = []     # enabled sinks; empty means instrumentation is off
+_counters = {}  # counter totals since the last flush
+_stack = []     # names of the currently open spans
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    __slots__ = ("name", "attrs", "start")
+
+    def __init__(self, name: str, attrs: dict) -> None:
+        self.name = name
+        self.attrs = attrs
+
+    def __enter__(self):
+        _stack.append(self.name)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        _stack.pop()
+        emit({"type": "span", "name": self.name, "seconds": seconds, "parent": _stack[-1] if _stack else None,
+              "time": time.time(), **({"attrs": self.attrs} if self.attrs else {})})
+        return False
+
+
+def span(name: str, **attrs):
+    """Context manager timing the enclosed block as span ``name``."""
+    return _Span(name, attrs) if _sinks else _NULL_SPAN
+
+
+def count(name: str, value=1) -> None:
+    """Add value to counter ``name``; totals are emitted by flush()."""
+    if _sinks:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def gauge(name: str, value, **attrs) -> None:
+    """Record a point value (e.g. trials per second)."""
+    if _sinks:
+        emit({"type": "gauge", "name": name, "value": value, "time": time.time(), **({"attrs": attrs} if attrs else {})})
+
+
+def emit(event: dict) -> None:
+    for sink in _sinks:
+        sink.write(event)
+
+
+def flush() -> None:
+    """Emit the accumulated counters as one event and reset them."""
+    if _sinks and _counters:
+        emit({"type": "counters", "values": dict(_counters), "time": time.time()})
+    _counters.clear()
+
+
+def enable(*sinks) -> None:
+    """Start sending events to sinks (in addition to any already enabled)."""
+    _sinks.extend(sinks)
+
+
+def disable() -> None:
+    """Flush counters and detach every sink."""
+    flush()
+    _sinks.clear()
+
+
+def is_enabled() -> bool:
+    return bool(_sinks)
+
+
+@contextmanager
+def instrumented(*sinks):
+    """Enable sinks for the duration of a with-block, then flush and detach them."""
+    enable(*sinks)
+    try:
+        yield sinks[0] if len(sinks) == 1 else sinks
+    finally:
+        flush()
+        for sink in sinks:
+            _sinks.remove(sink)
+
+
+class MemoryCollector:
+    """Sink keeping every event in memory, with span and counter summaries."""
+
+    def __init__(self) -> None:
+        self.events = []
+
+    def write(self, event: dict) -> None:
+        self.events.append(event)
+
+    def spans(self, name: str = None) -> list:
+        return [e for e in self.events if e["type"] == "span" and (name is None or e["name"] == name)]
+
+    def span_totals(self) -> dict:
+        """Total seconds and call count per span name."""
+        totals = {}
+        for event in self.spans():
+            total = totals.setdefault(event["name"], {"seconds": 0.0, "calls": 0})
+            total["seconds"] += event["seconds"]
+            total["calls"] += 1
+        return totals
+
+    @property
+    def counters(self) -> dict:
+        """Counter totals over every flushed counters event."""
+        totals = {}
+        for event in self.events:
+            if event["type"] == "counters":
+                for name, value in event["values"].items():
+                    totals[name] = totals.get(name, 0) + value
+        return totals
+
+
+class JSONLinesSink:
+    """Sink writing one JSON object per line to a path or an open text file."""
+
+    def __init__(self, target) -> None:
+        self.file = open(target, "a") if isinstance(target, str) else target
+        self._owns_file = isinstance(target, str)
+
+    def write(self, event: dict) -> None:
+        self.file.write(json.dumps(event, default=float) + "\n")
+
+    def close(self) -> None:
+        if self._owns_file:
+            self.file.close()
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+
+__author__ = "Kamyar Modjtahedzadeh"
+__date__ = "October 18, 2026"
+
+"""
+    Benchmark suite for the simulation hot paths.
+    Run from the repository root:
+
+        python -m src.subscripts.misc.benchmark                      # run, compare with the stored baseline
+        python -m src.subscripts.misc.benchmark --save-baseline      # run and overwrite the baseline
+        python -m src.subscripts.misc.benchmark --only cloud --json out.json
+
+    Every case is seeded and timed best-of-N with time.perf_counter; results are written as JSON
+    and any case slower than baseline·(1 + tolerance) is reported and makes the exit code 1, as
+    does a case missing from the baseline or whose workload (fragments, trials) differs from it.
+    Timings are machine specific: re-save the baseline on the machine that runs the comparison.
+"""
+
+from src.gdmpidc import *
+from src.gdmpidc_tools import *
+from src.geometric_analysis import *
+from main import count_points_near_line_optimized, count_points_near_lines_batched, monte_carlo_impact_probability
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sys
+import time
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+SEED = 12345
+# Measured fields of a case; every other field describes its workload
+TIMING_KEYS = ("seconds", "trials_per_second")
+# Parent mass of the hit-kernel and Monte Carlo cloud (~95k inside fragments under the exact shell law)
+KERNEL_PARENT_MASS = 1e5
+
+
+def timed(fn, repeat: int = 3, min_total: float = 0.5, max_repeat: int = 100) -> float:
+    """
+        Best wall time of fn (each call re-seeded) [s].
+
+        Runs at least repeat times and keeps going until min_total seconds have been spent
+        (up to max_repeat), so sub-millisecond cases are not dominated by noise.
+    """
+    best, total, calls = float("inf"), 0.0, 0
+    while calls < repeat or (total < min_total and calls < max_repeat):
+        np.random.seed(SEED)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        elapsed = time.perf_counter() - start
+        best, total, calls = min(best, elapsed), total + elapsed, calls + 1
+    return best
+
+
+def cloud_cases() -> dict:
+    results = {}
+    for par_mass in (100, 1000, 10000):
+        for label, res in (("default", (0.0001, 0.0005, 0.001)), ("coarse", (0.001, 0.001, 0.01))):
+            seconds = timed(lambda: Cloud(par_mass, 10, res=res), repeat=2)
+            results[f"cloud_build[M={par_mass:g},res={label}]"] = {"seconds": seconds, "fragments": len(Cloud(par_mass, 10, res=res, seed=SEED).fragments)}
+    for par_mass in (100, 1000):
+        seconds = timed(lambda: Cloud(par_mass, 10, res=None), repeat=2)
+        results[f"cloud_build[M={par_mass:g},res=continuous]"] = {"seconds": seconds, "fragments": len(Cloud(par_mass, 10, res=None, seed=SEED).fragments)}
+    return results
+
+
+def hit_kernel_cases() -> dict:
+    cloud = Cloud(KERNEL_PARENT_MASS, 10, seed=SEED)
+    points = np.asarray(cloud.all_points)
+    rng = np.random.default_rng(SEED)
+    chords = get_entry_exit_batch(64, cloud.radius, rng=rng)
+    line = line_parametric_3d(*chords[0])
+    subset = points[:5000]
+
+    results = {
+        "count_points_near_line[N=5000]": {"seconds": timed(lambda: count_points_near_line(line, subset, 1.0), repeat=1)},
+        "count_points_near_line_optimized": {"seconds": timed(lambda: count_points_near_line_optimized(line, points, 1.0))},
+        "count_points_near_lines_batched[64 chords]": {"seconds": timed(lambda: count_points_near_lines_batched(chords[:, 0], chords[:, 1], points, 1.0))},
+    }
+    grid = VoxelGrid(points, cell_size=2.0)
+    results["voxel_grid_build"] = {"seconds": timed(lambda: VoxelGrid(points, cell_size=2.0))}
+    results["voxel_grid_query[64 chords]"] = {"seconds": timed(lambda: [grid.count_near_line(p1, p2, 1.0) for p1, p2 in chords])}
+    for name in results:
+        results[name]["fragments"] = len(subset) if "N=5000" in name else len(points)
+    return results
+
+
+def chord_cases(n: int = 2000) -> dict:
+    radius = 100.0
+    return {
+        f"get_entry_exit[n={n}]": {"seconds": timed(lambda: [get_entry_exit(radius) for _ in range(n)])},
+        f"importance_sample_entry_exit[n={n}]": {"seconds": timed(lambda: [importance_sample_entry_exit(radius) for _ in range(n)])},
+        f"get_entry_exit_batch[n={n}]": {"seconds": timed(lambda: get_entry_exit_batch(n, radius))},
+        f"importance_sample_entry_exit_batch[n={n}]": {"seconds": timed(lambda: importance_sample_entry_exit_batch(n, radius))},
+    }
+
+
+def expansion_velocity_cases() -> dict:
+    def cold():
+        expansion_velocity.cache_clear()
+        expansion_velocity_table.cache_clear()
+        expansion_velocity(1000, 0.001, 15.0)
+
+    def warm():
+        for _ in range(1000):
+            expansion_velocity(1000, 0.001, 15.0)
+
+    return {
+        "expansion_velocity[cold]": {"seconds": timed(cold)},
+        "expansion_velocity[warm x1000]": {"seconds": timed(warm)},
+    }
+
+
+def monte_carlo_cases(num_trials: int = 2000) -> dict:
+    cloud = Cloud(KERNEL_PARENT_MASS, 10, seed=SEED)
+    results = {}
+    for label, kwargs in (("index", dict(use_index=True)), ("batched", dict(use_index=False))):
+        seconds = timed(lambda: monte_carlo_impact_probability(cloud, 1.0, num_trials=num_trials, use_sampling=False, **kwargs), repeat=1)
+        results[f"monte_carlo[{label}]"] = {"seconds": seconds, "trials_per_second": num_trials / seconds,
+                                            "fragments": len(cloud.all_points), "trials": num_trials}
+    return results
+
+
+SUITES = {
+    "cloud": cloud_cases,
+    "hit_kernel": hit_kernel_cases,
+    "chords": chord_cases,
+    "expansion_velocity": expansion_velocity_cases,
+    "monte_carlo": monte_carlo_cases,
+}
+
+
+def run(only: list = None) -> dict:
+    results = {}
+    for name, suite in SUITES.items():
+        if only and name not in only:
+            continue
+        print(f"Running {name} benchmarks...", file=sys.stderr)
+        results.update(suite())
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpus": os.cpu_count(),
+            "seed": SEED,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def compare(report: dict, baseline: dict, tolerance: float, min_delta: float = 1e-3) -> list:
+    """
+        Names of flagged cases: slower than baseline by more than tolerance (relative) and
+        min_delta seconds, missing from the baseline, or run on a different workload than it.
+    """
+    flagged = []
+    for name, current in report["results"].items():
+        reference = baseline.get("results", {}).get(name)
+        if reference is None:
+            print(f"  {name:<50} {current['seconds']:10.5f}s  NO BASELINE")
+            flagged.append(name)
+            continue
+        workload = {key: value for key, value in current.items() if key not in TIMING_KEYS}
+        reference_workload = {key: value for key, value in reference.items() if key not in TIMING_KEYS}
+        ratio = current["seconds"] / reference["seconds"]
+        if workload != reference_workload:
+            status = f"WORKLOAD CHANGED ({reference_workload} -> {workload})"
+        elif ratio > 1 + tolerance and current["seconds"] - reference["seconds"] > min_delta:
+            status = "REGRESSION"
+        else:
+            status = "ok"
+        print(f"  {name:<50} {current['seconds']:10.5f}s  baseline {reference['seconds']:10.5f}s  x{ratio:5.2f}  {status}")
+        if status != "ok":
+            flagged.append(name)
+    return flagged
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark cloud construction, hit counting and Monte Carlo throughput.")
+    parser.add_argument("--only", nargs="*", choices=list(SUITES), help="run only these suites")
+    parser.add_argument("--json", help="write the report to this file (default: stdout)")
+    parser.add_argument("--baseline", default=BASELINE_PATH, help="baseline report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed relative slowdown before flagging")
+    parser.add_argument("--save-baseline", action="store_true", help="store this run as the baseline")
+    args = parser.parse_args()
+
+    report = run(args.only)
+    text = json.dumps(report, indent=2)
+    if args.json:
+        with open(args.json, "w") as file:
+            file.write(text)
+    else:
+        print(text)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as file:
+            file.write(text + "\n")
+        print(f"Baseline saved to {args.baseline}", file=sys.stderr)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            flagged = compare(report, json.load(file), args.tolerance)
+        if flagged:
+            print(f"{len(flagged)} flagged case(s): {', '.join(flagged)}", file=sys.stderr)
+            sys.exit(1)
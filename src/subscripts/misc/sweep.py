@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+__author__ = "Kamyar Modjtahedzadeh"
+__date__ = "October 18, 2026"
+
+"""
+    Scenario sweeps: impact probabilities over a grid of clouds and analysis settings.
+    Run from the repository root:
+
+        python -m src.subscripts.misc.sweep scenarios.toml --out results.csv --workers 8
+
+    The config (TOML or JSON) holds an optional ``defaults`` table and one ``grid`` table (or an
+    array of them, ``[[grid]]``, whose scenarios are concatenated).  Every grid key maps to a value
+    or a list of values and the scenarios are their Cartesian product, over defaults:
+
+        [defaults]
+        seed = 1
+        num_trials = 10000
+
+        [grid]
+        parent_mass = [1000, 10000]
+        parent_radius = [10, 1000]
+        res = ["default", "continuous"]      # or explicit [r_small, r_medium, r_large] triples
+        hit_distance = [0.5, 1.0, 2.0]
+
+    Scenarios are scheduled in two stages on one process pool.  Every distinct cloud is built
+    once and stored in the CloudCache, then every distinct Monte Carlo job (scenarios that only
+    differ in hit_distance) memory-maps its cloud and evaluates all of its hit distances from one
+    set of trials (MonteCarloSession.sweep).  The results table has one row per scenario.
+"""
+
+from src.gdmpidc import *
+from src.cloud_io import *
+from src import instrumentation
+from main import MonteCarloSession
+from contextlib import contextmanager
+from multiprocessing import Pool
+import argparse
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+import tomllib
+
+# Scenario keys and their defaults; CLOUD_KEYS select the cloud, the rest the Monte Carlo job
+CLOUD_KEYS = {"parent_mass": 1000.0, "parent_radius": 10.0, "breakup_type": "collision", "min_size": 0.001, "max_size": 1.0,
+              "res": "default", "seed": 0}
+JOB_KEYS = {"num_trials": 10000, "confidence_level": 0.95, "use_sampling": True, "sample_fraction": 0.1, "use_index": True,
+            "batch_size": 1000, "sampler": "random", "replicates": 16, "precision": "float64"}
+SCENARIO_KEYS = {**CLOUD_KEYS, **JOB_KEYS, "hit_distance": 1.0}
+RESULT_COLUMNS = ("probability", "ci_lower", "ci_upper", "standard_error", "hits", "trials", "fragments_used",
+                  "cloud_fragments", "cloud_radius", "job_seconds")
+
+
+def load_config(path: str) -> dict:
+    """Parse a .toml or .json scenario file."""
+    with open(path, "rb") as file:
+        return tomllib.load(file) if path.endswith(".toml") else json.load(file)
+
+
+def expand(config: dict) -> list:
+    """
+        Scenario dicts (every SCENARIO_KEYS key set) of a config, in grid order.
+
+        Raises:
+            ValueError: on keys that are not scenario parameters
+    """
+    defaults = {**SCENARIO_KEYS, **config.get("defaults", {})}
+    grids = config.get("grid", [{}])
+    scenarios = []
+    for grid in grids if isinstance(grids, list) else [grids]:
+        unknown = (set(grid) | set(defaults)) - set(SCENARIO_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown scenario parameter(s): {', '.join(sorted(unknown))}")
+        # A bare res triple is one value, not three alternatives
+        axes = {key: values if isinstance(values, list) and not (key == "res" and values and not isinstance(values[0], (list, str))) else [values]
+                for key, values in grid.items()}
+        for combination in itertools.product(*axes.values()):
+            scenarios.append({**defaults, **dict(zip(axes, combination))})
+    return scenarios
+
+
+def cloud_arguments(scenario: dict) -> tuple:
+    """CloudCache.cloud arguments of a scenario; res "default" and "continuous" map to the Cloud default and None."""
+    res = {"default": (0.0001, 0.0005, 0.001), "continuous": None}.get(scenario["res"], scenario["res"]) if isinstance(scenario["res"], str) else tuple(scenario["res"])
+    return (float(scenario["parent_mass"]), float(scenario["parent_radius"]), scenario["breakup_type"],
+            float(scenario["min_size"]), float(scenario["max_size"]), res, int(scenario["seed"]))
+
+
+@contextmanager
+def traced(trace_path: str = None):
+    """Instrument one task into trace_path (appended, so every worker can share the file)."""
+    if trace_path is None:
+        yield
+        return
+    sink = instrumentation.JSONLinesSink(trace_path)
+    try:
+        with instrumentation.instrumented(sink):
+            yield
+    finally:
+        sink.close()
+
+
+def build_cloud(cache_root: str, arguments: tuple, trace_path: str = None) -> tuple:
+    """Stage 1 task: make sure the cloud is in the cache; returns (fragments, radius)."""
+    with traced(trace_path), instrumentation.span("sweep.cloud", parent_mass=arguments[0], parent_radius=arguments[1]):
+        cloud = CloudCache(cache_root).cloud(*arguments)
+    return len(cloud.all_points), cloud.radius
+
+
+def run_job(cache_root: str, arguments: tuple, job: tuple, hit_distances: list, seed_seq, trace_path: str = None) -> list:
+    """Stage 2 task: one MonteCarloSession on the cached cloud, evaluated at every hit distance."""
+    settings = dict(job)
+    start = time.time()
+    with traced(trace_path), instrumentation.span("sweep.job", n=settings["num_trials"], hit_distances=len(hit_distances)):
+        cloud = CloudCache(cache_root).cloud(*arguments)
+        session = MonteCarloSession(cloud, min(hit_distances), settings["confidence_level"], settings["use_sampling"], settings["sample_fraction"],
+                                    settings["use_index"], settings["batch_size"], rng=np.random.default_rng(seed_seq), verbose=False,
+                                    max_hit_distance=max(hit_distances), sampler=settings["sampler"], replicates=settings["replicates"],
+                                    precision=settings["precision"])
+        session.extend(settings["num_trials"])
+        results = session.sweep(hit_distances)
+    seconds = time.time() - start
+    return [{"probability": result["probability"], "ci_lower": result["confidence_interval"][0], "ci_upper": result["confidence_interval"][1],
+             "standard_error": result["standard_error"], "hits": result["hits"], "trials": result["trials"],
+             "fragments_used": result["fragments_used"], "job_seconds": seconds} for result in results.values()]
+
+
+def run_sweep(scenarios: list, cache_root: str = None, n_workers: int = None, trace_path: str = None) -> list:
+    """
+        Evaluate every scenario; returns one row per scenario (its parameters followed by RESULT_COLUMNS).
+
+        Monte Carlo job 𝑖 (in first-appearance order) draws from child 𝑖 of SeedSequence(seed) of
+        its scenarios, so results do not depend on n_workers.  With trace_path every task appends
+        its spans and counters there.
+    """
+    cache_root = CloudCache(cache_root).root
+    n_workers = n_workers or os.cpu_count() or 1
+
+    # Distinct clouds, and distinct jobs (cloud + settings) with the hit distances they need
+    clouds, jobs = {}, {}
+    for scenario in scenarios:
+        arguments = cloud_arguments(scenario)
+        clouds.setdefault(arguments, None)
+        job = (arguments, tuple((key, scenario[key]) for key in JOB_KEYS))
+        jobs.setdefault(job, set()).add(float(scenario["hit_distance"]))
+    print(f"{len(scenarios)} scenarios: {len(clouds)} clouds, {len(jobs)} Monte Carlo jobs on {n_workers} workers", file=sys.stderr)
+
+    job_list = list(jobs)
+    job_tasks = [(cache_root, arguments, settings, sorted(jobs[(arguments, settings)]), np.random.SeedSequence(arguments[-1], spawn_key=(i,)), trace_path)
+                 for i, (arguments, settings) in enumerate(job_list)]
+    cloud_tasks = [(cache_root, arguments, trace_path) for arguments in clouds]
+    if n_workers == 1:
+        cloud_info = [build_cloud(*task) for task in cloud_tasks]
+        job_rows = [run_job(*task) for task in job_tasks]
+    else:
+        with Pool(n_workers) as pool:
+            cloud_info = pool.starmap(build_cloud, cloud_tasks)
+            job_rows = pool.starmap(run_job, job_tasks)
+    clouds = dict(zip(clouds, cloud_info))
+
+    rows = []
+    by_job = {job: dict(zip(task[3], job_result)) for job, task, job_result in zip(job_list, job_tasks, job_rows)}
+    for scenario in scenarios:
+        arguments = cloud_arguments(scenario)
+        result = by_job[(arguments, tuple((key, scenario[key]) for key in JOB_KEYS))][float(scenario["hit_distance"])]
+        fragments, radius = clouds[arguments]
+        rows.append({**scenario, **result, "cloud_fragments": fragments, "cloud_radius": radius})
+    return rows
+
+
+def write_table(rows: list, path: str = None) -> None:
+    """Write rows as CSV (or JSON lines for a .jsonl path) to path, or CSV to stdout."""
+    columns = list(SCENARIO_KEYS) + list(RESULT_COLUMNS)
+    file = open(path, "w", newline="") if path else sys.stdout
+    try:
+        if path and path.endswith(".jsonl"):
+            for row in rows:
+                file.write(json.dumps({column: row[column] for column in columns}) + "\n")
+        else:
+            writer = csv.DictWriter(file, fieldnames=columns, extrasaction="ignore")
+            writer.writeheader()
+            writer.writerows({**row, "res": json.dumps(row["res"]) if isinstance(row["res"], list) else row["res"]} for row in rows)
+    finally:
+        if path:
+            file.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a grid of cloud / Monte Carlo scenarios and write one results table.")
+    parser.add_argument("config", help="scenario grid (.toml or .json)")
+    parser.add_argument("--out", help="results table (.csv, or .jsonl); default: CSV on stdout")
+    parser.add_argument("--workers", type=int, help="worker processes (default: os.cpu_count())")
+    parser.add_argument("--cache-dir", help="CloudCache directory (default: $DEBRIS_CLOUD_CACHE or ~/.cache/debris-cloud)")
+    parser.add_argument("--trace", help="append the instrumentation records of every task to this JSON-lines file")
+    args = parser.parse_args()
+
+    rows = run_sweep(expand(load_config(args.config)), args.cache_dir, args.workers, args.trace)
+    write_table(rows, args.out)
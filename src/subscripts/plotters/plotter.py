@@ -4,14 +4,21 @@ __date__ = "May 14, 2025"
 
 # import matplotlib; matplotlib.use('TkAgg')
 import matplotlib.pyplot as plt
+try:
+    from src.geometric_analysis import level_of_detail
+except ImportError:
+    from geometric_analysis import level_of_detail
+
+point_budget = 20_000  # points drawn; larger clouds are decimated by level_of_detail
 
 ## Assuming vec_r is a list of lists like [[x0, y0, z0], [x1, y1, z1], ...]
 vec_r = np.array(vec_r)  # Convert to numpy array for easier handling
+shown, _ = level_of_detail(vec_r, point_budget)
 
 ## Extract x, y, z coordinates
-x = vec_r[:, 0]
-y = vec_r[:, 1]
-z = vec_r[:, 2]
+x = vec_r[shown, 0]
+y = vec_r[shown, 1]
+z = vec_r[shown, 2]
 
 ## Create a new figure
 fig = plt.figure()
@@ -4,10 +4,17 @@ __date__ = "May 18, 2025"
 # 3D scatter plot for fragments inside cloud radius only
 import matplotlib.pyplot as plt
 import numpy as np
+try:
+    from src.geometric_analysis import level_of_detail
+except ImportError:
+    from geometric_analysis import level_of_detail
+
+point_budget = 20_000  # points drawn; larger clouds are decimated by level_of_detail
 
 # Filter points inside cloud radius
-inside_points = [point for point in vec_r if np.linalg.norm(point) <= cloud.radius]
-inside_points = np.array(inside_points)
+vec_r = np.asarray(vec_r, dtype=float).reshape(-1, 3)
+inside_points = vec_r[np.linalg.norm(vec_r, axis=1) <= cloud.radius]
+inside_points = inside_points[level_of_detail(inside_points, point_budget)[0]]
 
 # Extract x, y, z coordinates of inside points
 x = inside_points[:, 0]
@@ -6,14 +6,21 @@ __date__ = "June 2, 2025"
 import plotly.graph_objects as go
 import plotly.offline as pyo
 import numpy as np
+try:
+    from src.geometric_analysis import level_of_detail
+except ImportError:
+    from geometric_analysis import level_of_detail
+
+point_budget = 50_000  # points embedded in the HTML; larger clouds are decimated by level_of_detail
 
 ## Assuming vec_r is a list of lists like [[x0, y0, z0], [x1, y1, z1], ...]
 vec_r = np.array(vec_r)  # Convert to numpy array for easier handling
+shown, _ = level_of_detail(vec_r, point_budget)
 
 ## Extract x, y, z coordinates
-x = vec_r[:, 0]
-y = vec_r[:, 1]
-z = vec_r[:, 2]
+x = vec_r[shown, 0]
+y = vec_r[shown, 1]
+z = vec_r[shown, 2]
 
 # Create scatter plot trace
 scatter_trace = go.Scatter3d(
@@ -48,7 +55,7 @@ fig = go.Figure(data=[scatter_trace, wireframe_trace])
 
 # Update layout
 fig.update_layout(
-    title=f'Interactive Debris Cloud Visualization<br>{len(vec_r)} fragments within {cloud.radius:.1f}m radius',
+    title=f'Interactive Debris Cloud Visualization<br>{len(vec_r)} fragments within {cloud.radius:.1f}m radius ({len(shown)} shown)',
     scene=dict(
         xaxis_title='x [m]',
         yaxis_title='y [m]',